@@ -1,15 +1,31 @@
 import io
 import os
+import re
+import time
 import zipfile
-from zipfile import BadZipFile
+from tempfile import SpooledTemporaryFile
+from zipfile import ZIP_STORED, BadZipFile, ZipInfo
 
 from bs4 import BeautifulSoup
+from django.core.files import File
 from django.core.files.storage import default_storage
 from django.template.exceptions import TemplateDoesNotExist
 from django.template.backends.django import DjangoTemplates
+from django.template.context import make_context
 from django.utils.functional import cached_property
 
-from template_engines.utils import clean_tags
+from template_engines import settings as app_settings
+from template_engines.utils import clean_tags, split_merged, write_archive
+from template_engines.utils.archive import RawZipFile, StreamBuffer, TemplateArchive, split_xml_declaration
+from template_engines.utils.asynchronous import run_in_executor
+from template_engines.utils.cache import LRUCache, TTLCache
+from template_engines.utils.fetch import ImageFetcher
+from template_engines.utils.http import HttpClient, get_default_client
+from template_engines.utils.images import get_image_options
+
+NOT_CACHED = object()
+# variables, tags and comments of the Django template language
+TEMPLATE_SYNTAX_RE = re.compile(r'\{[{%#]')
 
 
 class AbstractTemplate:
@@ -17,8 +33,36 @@ class AbstractTemplate:
     Gives the architecture of a basic template.
     """
 
-    def __init__(self, template):
+    def __init__(self, template, backend=None):
+        """
+        :param template: the template to fill.
+        :type template: django.template.Template
+
+        :param backend: Optional, the engine which has loaded the template.
+        :type backend: BaseEngine
+        """
         self.template = template
+        self.backend = backend
+
+    @property
+    def http_client(self):
+        """
+        Client used to fetch remote pictures, the one of the engine if any.
+        """
+        return self.backend.http_client if self.backend is not None else get_default_client()
+
+    @property
+    def image_options(self):
+        """
+        Options of the embedded pictures, the ones of the engine if any.
+        """
+        return self.backend.image_options if self.backend is not None else {}
+
+    def get_fetcher(self):
+        """
+        Returns the ``ImageFetcher`` of a rendering.
+        """
+        return ImageFetcher(client=self.http_client, image_options=self.image_options)
 
     def clean(self, data):
         """
@@ -34,11 +78,188 @@ class AbstractTemplate:
         raise NotImplementedError()
 
 
+class ZipAbstractTemplate(AbstractTemplate):
+    """
+    Gives the architecture of a zip based template.
+
+    Can be specified:
+
+    * ``zip_root_files``, the files of the archive filled by the template,
+    * ``file_extension``, the extension of the rendered files.
+    """
+    zip_root_files = None
+    file_extension = ''
+
+    def __init__(self, template, template_path=None, archive=None, backend=None):
+        """
+        :param template: the compiled files to fill, by name, kept in ``templates``. The
+                         ``zip_root_files`` which are not given are copied from the template file
+                         as they are.
+        :type template: Dict[str, django.template.Template]
+
+        :param template_path: path to the template.
+        :type template_path: str
+
+        :param archive: Optional, the skeleton of the template file, read from ``template_path``
+                        otherwise.
+        :type archive: template_engines.utils.archive.TemplateArchive
+
+        :param backend: Optional, the engine which has loaded the template.
+        :type backend: ZipAbstractEngine
+        """
+        self.templates = template
+        self.backend = backend
+        self.template_path = template_path
+        self.archive = archive
+
+    @property
+    def template(self):
+        """
+        The compiled main file of the template, the first of ``zip_root_files``, or ``None`` if it
+        has no template syntax. ``templates`` gives every compiled file.
+        """
+        return self.templates.get(self.zip_root_files[0])
+
+    def get_archive(self):
+        """
+        Returns the skeleton of the template file.
+        """
+        if self.archive is None:
+            with default_storage.open(self.template_path, 'rb') as template_file:
+                self.archive = TemplateArchive(io.BytesIO(template_file.read()), list(self.templates))
+        return self.archive
+
+    def get_context(self, context=None, request=None):
+        """
+        Returns the context obtained by combining the `context` and` request` parameters.
+        """
+        return make_context(context, request)
+
+    def render_template(self, context):
+        """
+        Fills each file of the template with ``context``, returns the rendered content by name.
+        """
+        return {name: template.render(context) for name, template in self.templates.items()}
+
+    def post_process(self, context, rendered):
+        """
+        Processes the filled files of the template, once its remote pictures are fetched. Returns
+        the rendered content of each file of ``template`` and the other members to write in the
+        document, like images.
+        """
+        raise NotImplementedError()
+
+    def render_members(self, context=None, request=None):
+        """
+        Fills the template with the context obtained by combining the `context` and` request`
+        parameters. Returns the rendered content of each file of ``template`` and the other
+        members to write in the document, like images.
+        """
+        return self._render_members(self.get_fetcher(), context, request)
+
+    def _render_members(self, fetcher, context, request):
+        context = self.get_context(context, request)
+        with fetcher:
+            rendered = fetcher.resolve(self.render_template(context))
+            return self.post_process(context, rendered)
+
+    def render(self, context=None, request=None):
+        """
+        Fills a template with the context obtained by combining the `context` and` request`
+        parameters and returns a file as a byte object.
+        """
+        # a batch of one document
+        document, = self.render_many([context], request)
+        return document
+
+    async def arender(self, context=None, request=None):
+        """
+        Same as ``render``, without blocking the event loop: the template is filled in a bounded
+        executor and the remote pictures are fetched concurrently in between.
+        """
+        context = self.get_context(context, request)
+        fetcher = self.get_fetcher()
+        rendered = await run_in_executor(fetcher.run, self.render_template, context)
+        await fetcher.afetch()
+        return await run_in_executor(fetcher.run, self._write_fetched, context, fetcher, rendered)
+
+    def _write_fetched(self, context, fetcher, rendered):
+        rendered, members = self.post_process(context, fetcher.resolve(rendered))
+        return write_archive(self.get_archive(), rendered, members)
+
+    def render_many(self, contexts, request=None):
+        """
+        Fills the template with each context of ``contexts`` like ``render`` and yields the files as
+        byte objects. The skeleton of the template is shared by every document, and the remote
+        pictures by consecutive documents, so a picture used by every document is fetched once.
+        """
+        archive = self.get_archive()
+        fetcher = self.get_fetcher()
+        for context in contexts:
+            rendered, members = self._render_members(fetcher, context, request)
+            fetcher.release()
+            yield write_archive(archive, rendered, members)
+
+    def stream_many(self, contexts, name=None, request=None):
+        """
+        Fills the template with each context of ``contexts`` like ``render_many`` and yields a zip
+        file containing the documents by chunks, one for each document, to be given to a
+        ``StreamingHttpResponse``. Only one document is kept in memory at a time.
+
+        :param name: Optional, format of the names of the documents in the zip file, given the
+                     position of the document as ``index``, ``'{index:06d}'`` and the extension of
+                     the template by default.
+        :type name: str
+        """
+        name = name or '{index:06d}' + self.file_extension
+        buffer = StreamBuffer()
+        with RawZipFile(buffer, 'w') as write_zip_file:
+            for index, document in enumerate(self.render_many(contexts, request), 1):
+                zinfo = ZipInfo(name.format(index=index), date_time=time.localtime()[:6])
+                # the documents are already compressed
+                write_zip_file.writestr(zinfo, document, compress_type=ZIP_STORED)
+                yield buffer.pop()
+        yield buffer.pop()
+
+    def render_to_stream(self, context=None, request=None, fileobj=None):
+        """
+        Fills a template like ``render`` but writes the file in ``fileobj``, member after member.
+        ``fileobj`` only needs a ``write`` method.
+        """
+        rendered, members = self.render_members(context, request)
+        with RawZipFile(fileobj, 'w') as write_zip_file:
+            self.get_archive().write(write_zip_file, rendered, members)
+
+    def stream(self, context=None, request=None):
+        """
+        Fills a template like ``render`` but yields the file by chunks, one for each member, to be
+        given to a ``StreamingHttpResponse``.
+        """
+        rendered, members = self.render_members(context, request)
+        buffer = StreamBuffer()
+        with RawZipFile(buffer, 'w') as write_zip_file:
+            for _ in self.get_archive().iter_write(write_zip_file, rendered, members):
+                yield buffer.pop()
+        yield buffer.pop()
+
+
 class BaseEngine(DjangoTemplates):
+    """
+    The ``http`` entry of ``OPTIONS`` gives the options of the HTTP client fetching remote
+    pictures, see ``template_engines.utils.http.HttpClient``, and the ``images`` entry the options
+    of the embedded pictures, see ``template_engines.utils.images.get_image_options``.
+    """
     app_dirname = None
     sub_dirname = None
     template_class = None
 
+    def __init__(self, params):
+        params = params.copy()
+        options = params['OPTIONS'] = params['OPTIONS'].copy()
+        self.http_client = HttpClient(**options.pop('http', {}))
+        self.image_options = get_image_options(**options.pop('images', {}))
+        super().__init__(params)
+
     @cached_property
     def template_dirs(self):
         t_dirs = super().template_dirs
@@ -57,41 +278,119 @@ class ZipAbstractEngine(BaseEngine):
     * ``sub_dirname``, the folder name of the subdirectory in the templates directory,
     * ``template_class``, your own template class with a ``render`` method,
     * ``zip_root_file``, the file to fill.
+
+    Compiled templates are kept in memory, in a cache bounded by ``TEMPLATE_ENGINES_CACHE_MAX_SIZE``
+    bytes, until the modification time or the size of the template file changes. The members of
+    the template file read by the renderings are counted at the next lookup of the template. The
+    file is checked at most once every ``TEMPLATE_ENGINES_PATH_CACHE_TIMEOUT`` seconds. Set the
+    ``TEMPLATE_ENGINES_CACHE_TEMPLATES`` setting to ``False`` to disable it.
+
+    Resolved template paths, and names which cannot be found, are kept during
+    ``TEMPLATE_ENGINES_PATH_CACHE_TIMEOUT`` seconds, for at most
+    ``TEMPLATE_ENGINES_PATH_CACHE_MAX_ENTRIES`` names.
     """
     zip_root_files = None
+    cache_templates = app_settings.TEMPLATE_ENGINES_CACHE_TEMPLATES
+    cache_max_size = app_settings.TEMPLATE_ENGINES_CACHE_MAX_SIZE
+    path_cache_timeout = app_settings.TEMPLATE_ENGINES_PATH_CACHE_TIMEOUT
+    path_cache_max_entries = app_settings.TEMPLATE_ENGINES_PATH_CACHE_MAX_ENTRIES
 
-    def get_template_content(self, filename):
+    @cached_property
+    def template_cache(self):
+        return LRUCache(self.cache_max_size)
+
+    @cached_property
+    def path_cache(self):
+        return TTLCache(self.path_cache_timeout, self.path_cache_max_entries)
+
+    def invalidate_template_path(self, filename=None):
+        """
+        Forgets the cached path of ``filename``, or of every template if no filename is given.
+        """
+        if filename is None:
+            self.path_cache.clear()
+        else:
+            self.path_cache.delete(filename)
+
+    def reset(self):
         """
-        Returns the contents of a template before modification, as a string.
+        Empties the caches of template paths and of compiled templates.
+        """
+        self.path_cache.clear()
+        self.template_cache.clear()
+
+    def read_template_file(self, filename):
+        """
+        Returns the template file from the storage, as a buffer.
+        """
+        with default_storage.open(filename, 'rb') as template_file:
+            return io.BytesIO(template_file.read())
+
+    def read_template_members(self, template_buffer):
+        """
+        Returns the content of the files to fill of a template buffer by name, without their XML
+        declaration.
+        """
+        try:
+            with zipfile.ZipFile(template_buffer, 'r') as zip_file:
+                return {
+                    name: split_xml_declaration(zip_file.read(name).decode())[1]
+                    for name in self.zip_root_files
+                }
+        except (KeyError, BadZipFile):
+            raise TemplateDoesNotExist('Bad format.')
+
+    def is_static(self, name, content):
+        """
+        Returns ``True`` if the file to fill ``name`` does not depend on the context, so it can be
+        copied from the template file instead of being rendered.
+        """
+        return not TEMPLATE_SYNTAX_RE.search(content)
+
+    def merge_template_content(self, template_buffer):
+        """
+        Merges the files to fill of a template buffer, as a string.
         """
         try:
-            with default_storage.open(filename, 'rb') as template_file:
-                template_buffer = io.BytesIO(template_file.read())
-
-                with zipfile.ZipFile(template_buffer, 'r') as zip_file:
-                    soup = BeautifulSoup('', 'html.parser')
-                    global_tag = soup.new_tag("global-merged")
-
-                    for file_to_merge in self.zip_root_files:
-                        name, _ = os.path.splitext(file_to_merge)
-                        content = zip_file.read(file_to_merge).decode()
-                        content_soup = BeautifulSoup(content, 'xml')
-                        tag_file = content_soup.new_tag('{0}-merged'.format(name.replace('/', '-')))
-                        tag_file.append(content_soup)
-                        global_tag.append(tag_file)
-
-                    soup.append(global_tag)
-                    return str(soup)
+            with zipfile.ZipFile(template_buffer, 'r') as zip_file:
+                soup = BeautifulSoup('', 'html.parser')
+                global_tag = soup.new_tag("global-merged")
+
+                for file_to_merge in self.zip_root_files:
+                    name, _ = os.path.splitext(file_to_merge)
+                    content = zip_file.read(file_to_merge).decode()
+                    content_soup = BeautifulSoup(content, 'xml')
+                    tag_file = content_soup.new_tag('{0}-merged'.format(name.replace('/', '-')))
+                    tag_file.append(content_soup)
+                    global_tag.append(tag_file)
+
+                soup.append(global_tag)
+                return str(soup)
         except (KeyError, BadZipFile):
             raise TemplateDoesNotExist('Bad format.')
 
+    def get_template_content(self, filename):
+        """
+        Returns the contents of a template before modification, as a string, which can be given to
+        ``from_string``.
+        """
+        return self.merge_template_content(self.read_template_file(filename))
+
     def from_string(self, template_code, **kwargs):
-        return self.template_class(self.engine.from_string(template_code), **kwargs)
+        """
+        Compiles a template from the content of each of its files to fill, given by name or merged
+        in a string like the one returned by ``get_template_content``.
+        """
+        if isinstance(template_code, str):
+            template_code = split_merged(self.zip_root_files, template_code)
+        template = {name: self.engine.from_string(template_code[name])
+                    for name in self.zip_root_files if name in template_code}
+        return self.template_class(template, backend=self, **kwargs)
 
-    def get_template_path(self, filename):
+    def find_template_path(self, filename):
         """
-        Check if a template named ``template_name`` can be found in a list of directories. Returns
-        the path if the file exists or raises ``TemplateDoesNotExist`` otherwise.
+        Looks for a template named ``filename`` in the storage, then in the template directories.
+        Returns its path, or ``None`` if it can't be found.
         """
         if default_storage.exists(filename):
             return filename
@@ -99,13 +398,100 @@ class ZipAbstractEngine(BaseEngine):
             abstract_path = default_storage.generate_filename(os.path.join(directory, filename))
             if default_storage.exists(abstract_path):
                 return abstract_path
-        raise TemplateDoesNotExist(f'Unknown: {filename}')
+        return None
+
+    def get_template_path(self, filename):
+        """
+        Check if a template named ``template_name`` can be found in a list of directories. Returns
+        the path if the file exists or raises ``TemplateDoesNotExist`` otherwise.
+        """
+        path = self.path_cache.get(filename, NOT_CACHED)
+        if path is NOT_CACHED:
+            path = self.find_template_path(filename)
+            self.path_cache.set(filename, path)
+        if path is None:
+            raise TemplateDoesNotExist(f'Unknown: {filename}')
+        return path
 
     def clean_content(self, content):
         return clean_tags(content)
 
+    def get_template_stamp(self, template_path):
+        """
+        Returns the modification time and the size of a template file, used to detect that a
+        cached template is outdated.
+        """
+        try:
+            modified_time = default_storage.get_modified_time(template_path)
+        except NotImplementedError:
+            modified_time = None
+        return modified_time, default_storage.size(template_path)
+
+    def load_template(self, template_path):
+        template_buffer = self.read_template_file(template_path)
+        # each file is compiled on its own, as it is read, and the static ones are not compiled
+        members = self.read_template_members(template_buffer)
+        members = {name: self.clean_content(content) for name, content in members.items()
+                   if not self.is_static(name, content)}
+        archive = TemplateArchive(template_buffer, list(members))
+        return self.from_string(members, template_path=template_path, archive=archive)
+
     def get_template(self, template_name):
         template_path = self.get_template_path(template_name)
-        content = self.get_template_content(template_path)
-        content = self.clean_content(content)
-        return self.from_string(content, template_path=template_path)
+        try:
+            return self.get_cached_template(template_path)
+        except FileNotFoundError:
+            # the template file has been removed since its path has been cached
+            self.invalidate_template_path(template_name)
+            raise TemplateDoesNotExist(f'Unknown: {template_name}')
+
+    def get_cached_template(self, template_path):
+        if not self.cache_templates:
+            return self.load_template(template_path)
+
+        cached = self.template_cache.get(template_path)
+        if cached is not None:
+            size = self.get_template_size(cached[1])
+            if size != cached[3]:
+                # members of the archive read by the renderings since the template was cached
+                cached[3] = size
+                self.template_cache.set(template_path, cached, size)
+        now = time.monotonic()
+        if cached is not None and now < cached[2] + self.path_cache_timeout:
+            # checked recently, the storage is not queried
+            return cached[1]
+
+        stamp = self.get_template_stamp(template_path)
+        if cached is not None and cached[0] == stamp:
+            cached[2] = now
+            return cached[1]
+
+        template = self.load_template(template_path)
+        size = self.get_template_size(template)
+        # the stamp, the template, the time of the last check and the size counted in the cache
+        self.template_cache.set(template_path, [stamp, template, now, size], size)
+        return template
+
+    def get_template_size(self, template):
+        """
+        Size in bytes of a compiled template in the cache: the source of its files and the content
+        kept by its archive, including the members read since it was loaded.
+        """
+        return sum(len(member.source) for member in template.templates.values()) + template.archive.size
+
+    def render_to_storage(self, template_name, context=None, storage=None, name=None, request=None):
+        """
+        Renders a template and saves the document in a storage, ``default_storage`` by default.
+        The document is kept in memory up to ``TEMPLATE_ENGINES_SPOOL_MAX_SIZE`` bytes, in a
+        temporary file above.
+
+        :returns: the name given by the storage to the document and its size.
+        """
+        storage = storage or default_storage
+        template = self.get_template(template_name)
+        with SpooledTemporaryFile(max_size=app_settings.TEMPLATE_ENGINES_SPOOL_MAX_SIZE) as spooled_file:
+            template.render_to_stream(context, request, spooled_file)
+            size = spooled_file.tell()
+            spooled_file.seek(0)
+            saved_name = storage.save(name or os.path.basename(template_name), File(spooled_file))
+        return saved_name, size
@@ -1,30 +1,20 @@
 from pathlib import Path
 
-from bs4 import BeautifulSoup
-from django.template.context import make_context
 from django.template.exceptions import TemplateDoesNotExist
 
 from template_engines import settings as app_settings
-from template_engines.utils import modify_content_document
-from template_engines.utils.docx import add_image_in_docx_template, DOCX_PARAGRAPH_RE, DOCX_CHANGES, TO_CHANGE_RE
-from . import AbstractTemplate, ZipAbstractEngine
+from template_engines.utils.docx import (
+    get_docx_image_members, DOCX_PARAGRAPH_RE, DOCX_CHANGES, DOCX_RELATIONSHIPS, TO_CHANGE_RE
+)
+from . import ZipAbstractEngine, ZipAbstractTemplate
 
 
-class DocxTemplate(AbstractTemplate):
+class DocxTemplate(ZipAbstractTemplate):
     """
     Handles docx templates.
     """
-
-    def __init__(self, template, template_path=None):
-        """
-        :param template: the template to fill.
-        :type template: django.template.Template
-
-        :param template_path: path to the template.
-        :type template_path: str
-        """
-        super().__init__(template)
-        self.template_path = template_path
+    zip_root_files = ['word/document.xml']
+    file_extension = '.docx'
 
     def clean(self, data):
         return DOCX_PARAGRAPH_RE.sub(
@@ -35,19 +25,11 @@ class DocxTemplate(AbstractTemplate):
             data,
         )
 
-    def render(self, context=None, request=None):
-        """
-        Fills a docx template with the context obtained by combining the `context` and` request`
-        parameters and returns a docx file as a byte object.
-        """
-        context = make_context(context, request)
-        rendered = self.template.render(context)
-        rendered = self.clean(rendered)
-        soup = BeautifulSoup(rendered, features='html.parser')
-        docx_content = modify_content_document(self.template_path, ['word/document.xml'], soup)
-        for key, image in context.get('images', {}).items():
-            docx_content = add_image_in_docx_template(docx_content, image)
-        return docx_content
+    def post_process(self, context, rendered):
+        rendered = {name: self.clean(content) for name, content in rendered.items()}
+        images = list(context.get('images', {}).values())
+        members = get_docx_image_members(self.get_archive().read(DOCX_RELATIONSHIPS), images) if images else {}
+        return rendered, members
 
 
 class DocxEngine(ZipAbstractEngine):
@@ -63,13 +45,18 @@ class DocxEngine(ZipAbstractEngine):
     sub_dirname = app_settings.DOCX_ENGINE_SUB_DIRNAME
     app_dirname = app_settings.DOCX_ENGINE_APP_DIRNAME
     template_class = DocxTemplate
-    zip_root_files = ['word/document.xml']
+    zip_root_files = DocxTemplate.zip_root_files
 
     def __init__(self, params):
         params['OPTIONS'].setdefault('builtins', [])
         params['OPTIONS']['builtins'].extend(['template_engines.templatetags.docx_tags'])
         super().__init__(params)
 
+    def is_static(self, name, content):
+        # line breaks and bold markers are changed by DocxTemplate.clean
+        return super().is_static(name, content) and not any(
+            TO_CHANGE_RE.search(run.group(0)) for run in DOCX_PARAGRAPH_RE.finditer(content))
+
     def get_template_path(self, filename):
         path = super().get_template_path(filename)
         path_object = Path(path)
@@ -1,34 +1,135 @@
-import secrets
+import copy
+import io
+import re
+import warnings
 from pathlib import Path
 
 from bs4 import BeautifulSoup
-from django.template.context import make_context
 from django.template.exceptions import TemplateDoesNotExist
+from lxml import etree
 
 from template_engines import settings as app_settings
-from template_engines.utils import get_content_url, get_extension_picture, modify_content_document
-from template_engines.utils.odt import add_image_in_odt_template
-from . import AbstractTemplate, ZipAbstractEngine
+from template_engines.utils import get_extension_picture, get_picture_name, get_rendered_by_xml, merge_rendered, \
+    split_merged
+from template_engines.utils.archive import RawZipFile, StreamBuffer, split_xml_declaration
+from template_engines.templatetags.utils import size_to_inches
+from template_engines.utils.fetch import fetch_content_url, get_current_fetcher
+from template_engines.utils.images import get_picture_digest, get_response_digest, optimize_image
+from template_engines.utils.odt import ODT_MANIFEST, get_odt_image_members, odt_qname
+from . import ZipAbstractEngine, ZipAbstractTemplate
 
+PAGE_BREAK_STYLE = 'PAGE_BREAK'
+PAGE_BREAK = '<text:p text:style-name="{}"/>'.format(PAGE_BREAK_STYLE)
+PAGE_BREAK_STYLE_XML = (
+    '<style:style style:name="{}" style:family="paragraph">'
+    '<style:paragraph-properties fo:break-before="page"/></style:style>'
+).format(PAGE_BREAK_STYLE)
+# children of office:text which can appear only once by document
+ODT_TEXT_DECLS = [
+    'office:forms', 'text:tracked-changes', 'text:variable-decls', 'text:sequence-decls',
+    'text:user-field-decls', 'text:dde-connection-decls', 'table:calculation-settings',
+]
 
-class OdtTemplate(AbstractTemplate):
+AUTOMATIC_STYLES = odt_qname('office:automatic-styles')
+OFFICE_TEXT = odt_qname('office:text')
+TEXT_DECLS = [odt_qname(name) for name in ODT_TEXT_DECLS]
+TEXT_INPUT = odt_qname('text:text-input')
+TEXT_P = odt_qname('text:p')
+TEXT_STYLE_NAME = odt_qname('text:style-name')
+DRAW_IMAGE = odt_qname('draw:image')
+XLINK_HREF = odt_qname('xlink:href')
+SVG_WIDTH = odt_qname('svg:width')
+SVG_HEIGHT = odt_qname('svg:height')
+
+# the rendered content is not trusted, entities are not resolved
+XML_PARSER = etree.XMLParser(resolve_entities=False, no_network=True, huge_tree=True)
+OFFICE_TEXT_RE = re.compile(r'<office:text(\s[^>]*)?(/?)>')
+AUTOMATIC_STYLES_RE = re.compile(r'<office:automatic-styles(\s[^>]*)?(/?)>')
+# content changed by the post-processing: inputs and remote pictures
+POST_PROCESSED_RE = re.compile(r'<text:text-input\b|<draw:image\b[^>]*\bxlink:href="(?![^"]*Pictures)')
+
+
+def split_office_text(content):
+    """ Split an odt document before the content of its office:text element, and after """
+    match = OFFICE_TEXT_RE.search(content)
+    if match.group(2):
+        # empty element
+        return content[:match.start()] + '<office:text{}>'.format(match.group(1) or ''), '', \
+            '</office:text>' + content[match.end():]
+    end = content.rindex('</office:text>')
+    return content[:match.end()], content[match.end():end], content[end:]
+
+
+def insert_automatic_styles(content, styles):
+    """ Add styles, as XML, at the end of the automatic styles of an odt document """
+    match = AUTOMATIC_STYLES_RE.search(content)
+    if match is None:
+        body = content.find('<office:body')
+        if body == -1:
+            return content
+        return content[:body] + '<office:automatic-styles>{}</office:automatic-styles>'.format(styles) \
+            + content[body:]
+    if match.group(2):
+        # empty element
+        return content[:match.start()] + '<office:automatic-styles{}>{}</office:automatic-styles>'.format(
+            match.group(1) or '', styles) + content[match.end():]
+    end = content.index('</office:automatic-styles>', match.end())
+    return content[:end] + styles + content[end:]
+
+
+def get_style_definitions(content, name):
+    """ Returns the definitions of the style ``name`` in an odt document, parsed by html.parser """
+    definition_re = re.compile(
+        r'<(style:style|text:list-style)\s[^>]*?\bstyle:name="{}"[^>]*?(?:/>|>.*?</\1>)'.format(re.escape(name)), re.S)
+    return [BeautifulSoup(match.group(0), 'html.parser').contents[0] for match in definition_re.finditer(content)]
+
+
+def add_automatic_styles(content, automatic_styles):
     """
-    Handles odt templates.
-    Check http://docs.oasis-open.org/office/v1.2/os/OpenDocument-v1.2-os-part1.html#__RefHeading__1418974_253892949 for hints
+    Adds ``automatic_styles``, XML by name, to the automatic styles of an odt document. A style is
+    not added when the document has the same definition, the attributes being in any order.
     """
+    styles = []
+    for name, style in automatic_styles:
+        definition = BeautifulSoup(style, 'html.parser').contents[0]
+        if definition not in get_style_definitions(content, name):
+            styles.append(style)
+    if not styles:
+        return content
+    return insert_automatic_styles(content, ''.join(styles))
 
-    def __init__(self, template, template_path=None):
-        """
-        :param template: the template to fill.
-        :type template: django.template.Template
 
-        :param template_path: path to the template.
-        :type template_path: str
-        """
-        super().__init__(template)
-        self.template_path = template_path
+def append_text(element, text):
+    """ Add text at the end of an lxml element """
+    if not text:
+        return
+    if len(element):
+        element[-1].tail = (element[-1].tail or '') + text
+    else:
+        element.text = (element.text or '') + text
+
+
+def remove_element(element):
+    """ Remove an lxml element, keeping the text following it """
+    parent = element.getparent()
+    previous = element.getprevious()
+    if previous is not None:
+        previous.tail = (previous.tail or '') + (element.tail or '')
+    else:
+        parent.text = (parent.text or '') + (element.tail or '')
+    parent.remove(element)
+
+
+class OdtTemplate(ZipAbstractTemplate):
+    """
+    Handles odt templates.
+    Check http://docs.oasis-open.org/office/v1.2/os/OpenDocument-v1.2-os-part1.html#__RefHeading__1418974_253892949 for hints
+    """
+    zip_root_files = ['content.xml', 'styles.xml']
+    file_extension = '.odt'
 
-    def _get_automatic_style(self, soup, style_attrs=None, properties_attrs=None):
+    @classmethod
+    def _get_automatic_style(cls, soup, style_attrs=None, properties_attrs=None):
         # set params immutables
         if properties_attrs is None:
             properties_attrs = {}
@@ -44,7 +145,8 @@ class OdtTemplate(AbstractTemplate):
         style.append(style_properties)
         return style
 
-    def get_automatic_style_bold(self, soup):
+    @classmethod
+    def get_automatic_style_bold(cls, soup):
         """ get style for bold """
         style_attrs = {
             "style:name": "BOLD",
@@ -55,22 +157,24 @@ class OdtTemplate(AbstractTemplate):
             "style:font-weight-asian": "bold",
             "style:font-weight-complex": "bold",
         }
-        return self._get_automatic_style(
+        return cls._get_automatic_style(
             soup, style_attrs, text_prop_attrs
         )
 
-    def get_automatic_style_italic(self, soup):
+    @classmethod
+    def get_automatic_style_italic(cls, soup):
         """ get style for italic """
         style_attrs = {
             "style:name": "ITALIC",
             "style:family": "text"
         }
         text_prop_attrs = {"fo:font-style": "italic", }
-        return self._get_automatic_style(
+        return cls._get_automatic_style(
             soup, style_attrs, text_prop_attrs
         )
 
-    def get_automatic_style_underline(self, soup):
+    @classmethod
+    def get_automatic_style_underline(cls, soup):
         """ get style for underline """
         style_attrs = {
             "style:name": "UNDERLINE",
@@ -81,11 +185,12 @@ class OdtTemplate(AbstractTemplate):
             "style:text-underline-width": "auto",
             "style:text-underline-color": "font-color"
         }
-        return self._get_automatic_style(
+        return cls._get_automatic_style(
             soup, style_attrs, text_prop_attrs
         )
 
-    def get_automatic_style_sup(self, soup):
+    @classmethod
+    def get_automatic_style_sup(cls, soup):
         """ get style for sup """
         style_attrs = {
             "style:name": "SUP",
@@ -94,11 +199,12 @@ class OdtTemplate(AbstractTemplate):
         text_prop_attrs = {
             "style:text-position": "super 58%"
         }
-        return self._get_automatic_style(
+        return cls._get_automatic_style(
             soup, style_attrs, text_prop_attrs
         )
 
-    def get_automatic_style_sub(self, soup):
+    @classmethod
+    def get_automatic_style_sub(cls, soup):
         """ get style for sub """
         style_attrs = {
             "style:name": "SUB",
@@ -107,11 +213,12 @@ class OdtTemplate(AbstractTemplate):
         text_prop_attrs = {
             "style:text-position": "sub 58%"
         }
-        return self._get_automatic_style(
+        return cls._get_automatic_style(
             soup, style_attrs, text_prop_attrs
         )
 
-    def get_automatic_style_orderedlist(self, soup):
+    @classmethod
+    def get_automatic_style_orderedlist(cls, soup):
         """ get style for orderedlist """
         style = soup.new_tag('text:list-style')
         style_ol_attrs = {
@@ -132,7 +239,8 @@ class OdtTemplate(AbstractTemplate):
         style_list_properties.append(style_alignment)
         return style
 
-    def get_automatic_style_unorderedlist(self, soup):
+    @classmethod
+    def get_automatic_style_unorderedlist(cls, soup):
         """ get style for unorderedlist """
         style = soup.new_tag('text:list-style')
         style_ul_attrs = {
@@ -153,46 +261,37 @@ class OdtTemplate(AbstractTemplate):
         style_list_properties.append(style_alignment)
         return style
 
-    def clean(self, soup):
-        """ Add styles for html filters """
-
-        # find automatic-styles tag
-        automatic_styles = soup.find('office:automatic-styles')
-
-        # add bold style
-        style_bold = self.get_automatic_style_bold(soup)
-        automatic_styles.append(style_bold)
-        # add italic style
-        style_bold = self.get_automatic_style_italic(soup)
-        automatic_styles.append(style_bold)
-        # add underline style
-        style_underline = self.get_automatic_style_underline(soup)
-        automatic_styles.append(style_underline)
-        # add orderedline style
-        style_orderedlist = self.get_automatic_style_orderedlist(soup)
-        automatic_styles.append(style_orderedlist)
-        # add unorderedline style
-        style_unorderedlist = self.get_automatic_style_unorderedlist(soup)
-        automatic_styles.append(style_unorderedlist)
-        # add sup style
-        style_sup = self.get_automatic_style_sup(soup)
-        automatic_styles.append(style_sup)
-        # add sub style
-        style_sub = self.get_automatic_style_sub(soup)
-        automatic_styles.append(style_sub)
+    @classmethod
+    def get_automatic_styles(cls):
+        """ styles for html filters, as XML by name, added to content.xml when the template is compiled """
+        soup = BeautifulSoup('', 'html.parser')
+        styles = [
+            cls.get_automatic_style_bold(soup),
+            cls.get_automatic_style_italic(soup),
+            cls.get_automatic_style_underline(soup),
+            cls.get_automatic_style_orderedlist(soup),
+            cls.get_automatic_style_unorderedlist(soup),
+            cls.get_automatic_style_sup(soup),
+            cls.get_automatic_style_sub(soup),
+        ]
+        return [(style['style:name'], str(style)) for style in styles]
 
-        return soup
+    def clean(self, soup):
+        """
+        Add styles for html filters. Deprecated: they are added to ``content.xml`` when the
+        template is compiled, see ``OdtEngine.add_automatic_styles``.
+        """
+        warnings.warn('OdtTemplate.clean is deprecated, the styles for html filters are added when the template '
+                      'is compiled', DeprecationWarning, stacklevel=2)
+        return BeautifulSoup(add_automatic_styles(str(soup), self.get_automatic_styles()), 'html.parser')
 
     def replace_inputs(self, soup):
         """ Replace all text:text-input to text-span """
         input_list = soup.find_all("text:text-input")
 
         for tag in input_list:
-            contents = ''
-            for e in tag.contents:
-                # get tag content formatted (keep nested tags)
-                contents = f'{contents}{e}'
-            content_soup = BeautifulSoup(contents, 'html.parser')
+            # nested tags are kept, the text stays escaped as in the rendered content
+            content_soup = BeautifulSoup(tag.decode_contents(), 'html.parser')
             if content_soup.findChildren("text:p", recursive=False):
                 style_parent_name = tag.find_parent('text:p')['text:style-name']
                 for child in content_soup.findChildren("text:p", recursive=False):
@@ -203,36 +302,239 @@ class OdtTemplate(AbstractTemplate):
             tag.extract()
         return soup
 
+    def embed_picture(self, url, width, height, context):
+        """ Returns the path of a remote picture embedded in the document, None if not accessible """
+        response = fetch_content_url(url, "get", {})
+        if not response:
+            return None
+        context.setdefault('images', {})
+        picture, digest = response.content, get_response_digest(response)
+        optimized = self.optimize_picture(picture, width, height, digest)
+        if optimized is not picture:
+            picture, digest = optimized, get_picture_digest(optimized)
+        extension = get_extension_picture(picture, digest)
+        full_name = get_picture_name(picture, extension, digest)
+        context['images'].update({full_name: picture})
+        return 'Pictures/%s' % full_name
+
     def change_pictures_tag(self, tag, context):
-        name = secrets.token_hex(15)
-        response = get_content_url(tag['xlink:href'], "get", {})
-        if response:
-            context.setdefault('images', {})
-            picture = response.content
-            extension = get_extension_picture(picture)
-            full_name = '{}.{}'.format(name, extension)
-            context['images'].update({full_name: picture})
-            tag['xlink:href'] = 'Pictures/%s' % full_name
+        frame = tag.parent
+        width, height = (frame.get('svg:width'), frame.get('svg:height')) if frame is not None else (None, None)
+        path = self.embed_picture(tag['xlink:href'], width, height, context)
+        if path:
+            tag['xlink:href'] = path
+
+    def optimize_picture(self, picture, width, height, digest=None):
+        """ Resample and re-encode a picture as set by the engine, at the size of its frame """
+        options = self.image_options
+        if not any(options.values()) or width is None or height is None:
+            return picture
+        try:
+            width, height = size_to_inches(width, height)
+        except (AttributeError, KeyError, ValueError):
+            # the size of the frame is unknown
+            return picture
+        return optimize_image(picture, width, height, digest=digest, **options)
 
     def replace_pictures(self, soup, context):
-        draw_list = soup.find_all("draw:image")
+        draw_list = [tag for tag in soup.find_all("draw:image") if 'Pictures' not in tag['xlink:href']]
+        fetcher = get_current_fetcher()
+        if fetcher is not None:
+            # fetch every picture at once
+            for tag in draw_list:
+                fetcher.add(tag['xlink:href'], "get", {})
+            fetcher.fetch()
         for tag in draw_list:
-            if 'Pictures' not in tag['xlink:href']:
-                self.change_pictures_tag(tag, context)
+            self.change_pictures_tag(tag, context)
         return soup
 
-    def render(self, context=None, request=None):
-        context = make_context(context, request)
-        rendered = self.template.render(context)
+    def get_context(self, context=None, request=None):
+        context = super().get_context(context, request)
+        # images added by the tags must outlive the blocks pushing a new context level
+        context.setdefault('images', {})
+        return context
+
+    def process_soup(self, context, rendered):
         soup = BeautifulSoup(rendered, features='html.parser')
-        soup = self.clean(soup)
         soup = self.replace_inputs(soup)
-        soup = self.replace_pictures(soup, context)
+        return self.replace_pictures(soup, context)
 
-        odt_content = modify_content_document(self.template_path, ['content.xml', 'styles.xml'], soup)
-        for key, image in context.get('images', {}).items():
-            odt_content = add_image_in_odt_template(odt_content, image, key)
-        return odt_content
+    def replace_input_element(self, element):
+        """ lxml version of replace_inputs for a text:text-input """
+        paragraph = next(element.iterancestors(TEXT_P), None)
+        if paragraph is None:
+            paragraph = element.getparent()
+        text, children = element.text, list(element)
+        remove_element(element)
+        if any(child.tag == TEXT_P for child in children):
+            style_parent_name = paragraph.get(TEXT_STYLE_NAME)
+            for child in children:
+                if child.tag == TEXT_P and style_parent_name is not None:
+                    child.set(TEXT_STYLE_NAME, style_parent_name)
+            # the content goes after the paragraph, before the text following it
+            tail, paragraph.tail = paragraph.tail, text
+            for child in reversed(children):
+                paragraph.addnext(child)
+            if tail:
+                children[-1].tail = (children[-1].tail or '') + tail
+        else:
+            append_text(paragraph, text)
+            paragraph.extend(children)
+
+    def process_tree(self, context, roots):
+        """
+        Same as ``process_soup`` on the documents parsed by lxml, walked once: replaces the inputs
+        and embeds the remote pictures.
+        """
+        inputs = []
+        pictures = []
+        for root in roots:
+            for element in root.iter(TEXT_INPUT, DRAW_IMAGE):
+                if element.tag == TEXT_INPUT:
+                    inputs.append(element)
+                elif 'Pictures' not in element.get(XLINK_HREF, 'Pictures'):
+                    pictures.append(element)
+
+        for element in inputs:
+            self.replace_input_element(element)
+
+        fetcher = get_current_fetcher()
+        if fetcher is not None and pictures:
+            # fetch every picture at once
+            for element in pictures:
+                fetcher.add(element.get(XLINK_HREF), "get", {})
+            fetcher.fetch()
+        for element in pictures:
+            frame = element.getparent()
+            path = self.embed_picture(element.get(XLINK_HREF), frame.get(SVG_WIDTH), frame.get(SVG_HEIGHT), context)
+            if path:
+                element.set(XLINK_HREF, path)
+        return roots
+
+    def process_rendered(self, context, rendered):
+        """
+        Processes the filled files of the template, returns their content by name.
+        """
+        names = [name for name in self.zip_root_files if name in rendered]
+        try:
+            roots = [etree.fromstring(rendered[name], XML_PARSER) for name in names]
+        except etree.XMLSyntaxError:
+            # html.parser accepts content which is not well formed
+            soup = self.process_soup(context, merge_rendered(names, rendered))
+            return {name: str(content) for name, content in get_rendered_by_xml(names, soup).items()}
+        self.process_tree(context, roots)
+        return {name: etree.tostring(root, encoding='unicode') for name, root in zip(names, roots)}
+
+    def post_process(self, context, rendered):
+        rendered = self.process_rendered(context, rendered)
+        images = context.get('images', {})
+        members = get_odt_image_members(self.get_archive().read(ODT_MANIFEST), images) if images else {}
+        return rendered, members
+
+    def _render_record(self, fetcher, context, request):
+        context = self.get_context(context, request)
+        with fetcher:
+            rendered = self.process_rendered(context, fetcher.resolve(self.render_template(context)))
+        fetcher.release()
+        return rendered, context.get('images', {})
+
+    def get_record_body(self, content):
+        """ Returns the body of a record, without the declarations written once by document """
+        try:
+            root = etree.fromstring(content, XML_PARSER)
+        except etree.XMLSyntaxError:
+            # not well formed, as processed by html.parser
+            office_text = BeautifulSoup(content, features='html.parser').find('office:text')
+            for declarations in office_text.find_all(ODT_TEXT_DECLS, recursive=False):
+                declarations.extract()
+            return ''.join(str(child) for child in office_text.contents)
+        office_text = root.find('.//' + OFFICE_TEXT)
+        for element in list(office_text):
+            if element.tag in TEXT_DECLS:
+                remove_element(element)
+        return split_office_text(etree.tostring(root, encoding='unicode'))[1]
+
+    def iter_merge(self, write_zip_file, contexts, request=None):
+        """
+        Writes a single document in an open zip file, in which the body of the template is
+        repeated for each context of ``contexts``, a page break separating the records. Yields once
+        each record is written.
+
+        The styles and the other members come from the first record. ``content.xml`` is written
+        record after record, so only one record is kept in memory, with the pictures, which are
+        written last.
+        """
+        archive = self.get_archive()
+        fetcher = self.get_fetcher()
+        records = iter(contexts)
+        try:
+            first_context = next(records)
+        except StopIteration:
+            raise ValueError("At least one context is needed to merge records.")
+
+        rendered, images = self._render_record(fetcher, first_context, request)
+        images = dict(images)
+        if 'content.xml' in rendered:
+            header = archive.headers['content.xml']
+        else:
+            # the records are all the same
+            header, rendered['content.xml'] = split_xml_declaration(archive.read('content.xml').decode())
+        # the records are written between the head and the tail of content.xml
+        head, body, tail = split_office_text(insert_automatic_styles(rendered['content.xml'], PAGE_BREAK_STYLE_XML))
+
+        manifest_item = None
+        for item in archive.infolist:
+            if item.filename == 'content.xml':
+                with write_zip_file.open(copy.copy(item), 'w') as member:
+                    member.write((header + head + body).encode())
+                    yield
+                    for context in records:
+                        record, record_images = self._render_record(fetcher, context, request)
+                        images.update(record_images)
+                        record_content = record.get('content.xml', rendered['content.xml'])
+                        member.write((PAGE_BREAK + self.get_record_body(record_content)).encode())
+                        yield
+                    member.write(tail.encode())
+            elif item.filename == ODT_MANIFEST:
+                # written once every picture is known
+                manifest_item = copy.copy(item)
+            elif item.filename in archive.rendered_files:
+                write_zip_file.writestr(copy.copy(item), archive.headers[item.filename] + rendered[item.filename])
+            else:
+                write_zip_file.write_raw(item, archive.get_raw_member(item))
+
+        members = get_odt_image_members(archive.read(ODT_MANIFEST), images)
+        for filename, content in members.items():
+            write_zip_file.writestr(manifest_item if filename == ODT_MANIFEST else filename, content)
+
+    def render_merged(self, contexts, request=None):
+        """
+        Fills the template with each context of ``contexts`` and returns a single document as a
+        byte object, see ``iter_merge``.
+        """
+        buffer = io.BytesIO()
+        self.render_merged_to_stream(contexts, request, buffer)
+        return buffer.getvalue()
+
+    def render_merged_to_stream(self, contexts, request=None, fileobj=None):
+        """
+        Same as ``render_merged`` but writes the document in ``fileobj``, record after record.
+        ``fileobj`` only needs a ``write`` method.
+        """
+        with RawZipFile(fileobj, 'w') as write_zip_file:
+            for _ in self.iter_merge(write_zip_file, contexts, request):
+                pass
+
+    def stream_merged(self, contexts, request=None):
+        """
+        Same as ``render_merged`` but yields the document by chunks, one for each record, to be
+        given to a ``StreamingHttpResponse``.
+        """
+        buffer = StreamBuffer()
+        with RawZipFile(buffer, 'w') as write_zip_file:
+            for _ in self.iter_merge(write_zip_file, contexts, request):
+                yield buffer.pop()
+        yield buffer.pop()
 
 
 class OdtEngine(ZipAbstractEngine):
@@ -248,13 +550,35 @@ class OdtEngine(ZipAbstractEngine):
     sub_dirname = app_settings.ODT_ENGINE_SUB_DIRNAME
     app_dirname = app_settings.ODT_ENGINE_APP_DIRNAME
     template_class = OdtTemplate
-    zip_root_files = ['content.xml', 'styles.xml']
+    zip_root_files = OdtTemplate.zip_root_files
 
     def __init__(self, params):
         params['OPTIONS'].setdefault('builtins', [])
         params['OPTIONS']['builtins'].extend(['template_engines.templatetags.odt_tags'])
         super().__init__(params)
 
+    def add_automatic_styles(self, content):
+        """
+        Adds the styles for html filters to the automatic styles of ``content``, the source of
+        ``content.xml``, so they are part of the compiled template instead of being added at each
+        rendering. The styles the template already defines the same way are not added again.
+        """
+        return add_automatic_styles(content, self.template_class.get_automatic_styles())
+
+    def is_static(self, name, content):
+        if not super().is_static(name, content) or POST_PROCESSED_RE.search(content):
+            return False
+        # the styles for html filters are added to content.xml
+        return name != 'content.xml' or self.add_automatic_styles(content) == content
+
+    def from_string(self, template_code, **kwargs):
+        if isinstance(template_code, str):
+            template_code = split_merged(self.zip_root_files, template_code)
+        template_code = dict(template_code)
+        if 'content.xml' in template_code:
+            template_code['content.xml'] = self.add_automatic_styles(template_code['content.xml'])
+        return super().from_string(template_code, **kwargs)
+
     def get_template_path(self, filename):
         path = super().get_template_path(filename)
         path_object = Path(path)
@@ -7,6 +7,8 @@ from django.template.exceptions import TemplateDoesNotExist
 
 from template_engines import settings as app_settings, settings
 from template_engines.backends import AbstractTemplate, BaseEngine
+from template_engines.utils import get_content_url
+from template_engines.utils.asynchronous import run_in_executor
 
 
 class WeasyprintTemplate(AbstractTemplate):
@@ -20,22 +22,63 @@ class WeasyprintTemplate(AbstractTemplate):
             request.build_absolute_uri('/') if request else '/'
         )
 
-    def render(self, context=None, request=None):
-        base_url = self.get_base_url(request)
+    def url_fetcher(self, url, *args, **kwargs):
+        """
+        Fetches the remote resources of the document, like ``<img>`` URLs, with the HTTP client of
+        the engine and through the asset cache. Other URLs are fetched by WeasyPrint.
+        """
+        if not url.lower().startswith(('http://', 'https://')):
+            return weasyprint.default_url_fetcher(url, *args, **kwargs)
+        response = get_content_url(url, 'get', None, self.http_client)
+        if response is None:
+            raise ValueError(f'{url} is not accessible')
+        mime_type = response.headers.get('content-type', '').split(';')[0].strip()
+        return {
+            'string': response.content,
+            'mime_type': mime_type or None,
+            'redirected_url': response.url or url,
+        }
+
+    def get_context(self, context=None, request=None):
         if context is None:
             context = {}
         if request is not None:
             context['request'] = request
             context['csrf_input'] = csrf_input_lazy(request)
             context['csrf_token'] = csrf_token_lazy(request)
+        return make_context(context)
 
+    def write_pdf(self, rendered, base_url):
         html = weasyprint.HTML(
-            string=self.template.render(make_context(context)),
+            string=rendered,
             base_url=base_url,
+            url_fetcher=self.url_fetcher,
         )
         html.render()
         return html.write_pdf()
 
+    def render(self, context=None, request=None):
+        base_url = self.get_base_url(request)
+        context = self.get_context(context, request)
+        with self.get_fetcher() as fetcher:
+            rendered = fetcher.resolve(self.template.render(context))
+        return self.write_pdf(rendered, base_url)
+
+    async def arender(self, context=None, request=None):
+        """
+        Same as ``render``, without blocking the event loop: the template is filled and laid out in
+        a bounded executor and the remote pictures are fetched concurrently in between.
+        """
+        base_url = self.get_base_url(request)
+        context = self.get_context(context, request)
+        fetcher = self.get_fetcher()
+        rendered = await run_in_executor(fetcher.run, self.template.render, context)
+        await fetcher.afetch()
+        return await run_in_executor(self._write_fetched, fetcher, rendered, base_url)
+
+    def _write_fetched(self, fetcher, rendered, base_url):
+        return self.write_pdf(fetcher.resolve(rendered), base_url)
+
 
 class WeasyprintEngine(BaseEngine):
     sub_dirname = app_settings.WEASYPRINT_ENGINE_SUB_DIRNAME
@@ -56,4 +99,4 @@ class WeasyprintEngine(BaseEngine):
         if template_path.suffix.lower() != '.html':
             if ".pdf" not in template_path.suffixes[0]:
                 raise TemplateDoesNotExist('This is not a template PDF file')
-        return self.template_class(self.engine.get_template(template_name))
+        return self.template_class(self.engine.get_template(template_name), backend=self)
@@ -0,0 +1,257 @@
+import multiprocessing
+import time
+from collections import namedtuple
+from multiprocessing.connection import wait
+
+from template_engines import settings as app_settings
+
+READY = 'ready'
+
+BulkResult = namedtuple('BulkResult', ['index', 'template_name', 'content', 'error'])
+BulkResult.__doc__ = """
+Result of a job: the rendered document as a byte object in ``content``, or the reason of the
+failure in ``error``.
+"""
+
+
+def render_worker(conn, using, warm_templates):
+    """
+    Main function of a worker process: renders the jobs received on ``conn`` until it is closed.
+    """
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    from django.template import loader
+
+    for template_name in warm_templates:
+        # compiles the templates, kept in the cache of the engine
+        try:
+            loader.get_template(template_name, using=using)
+        except Exception:
+            pass
+    conn.send(READY)
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        index, template_name, context = job
+        try:
+            content = loader.get_template(template_name, using=using).render(context)
+        except Exception as e:
+            conn.send((index, None, f'{type(e).__name__}: {e}'))
+        else:
+            conn.send((index, content, None))
+    conn.close()
+
+
+class Worker:
+    """
+    A worker process and the connection to send it jobs.
+    """
+
+    def __init__(self, mp_context, using, warm_templates):
+        self.conn, child_conn = mp_context.Pipe()
+        self.process = mp_context.Process(target=render_worker, args=(child_conn, using, warm_templates),
+                                          daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.job = None
+        self.deadline = None
+
+    def send(self, job, timeout):
+        self.job = job
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.conn.send(job)
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+
+
+class BulkRenderer:
+    """
+    Renders many ``(template_name, context)`` jobs in a pool of worker processes, with the engines
+    configured in the ``TEMPLATES`` setting.
+
+    Each worker sets Django up and compiles the ``warm_templates`` once, then renders jobs until the
+    renderer is closed. A job running longer than ``timeout`` seconds, or killing its worker, fails
+    alone: its worker is replaced and the other jobs go on.
+
+    ::
+
+        with BulkRenderer(using='odt', warm_templates=['invoice.odt']) as renderer:
+            for result in renderer.render(('invoice.odt', {'object': obj}) for obj in invoices):
+                ...
+    """
+
+    def __init__(self, workers=None, timeout=None, using=None, warm_templates=(), mp_context=None):
+        """
+        :param workers: number of worker processes, ``TEMPLATE_ENGINES_BULK_WORKERS`` by default.
+        :type workers: int
+
+        :param timeout: maximum duration of a job in seconds, ``TEMPLATE_ENGINES_BULK_TIMEOUT`` by
+                        default.
+        :type timeout: float
+
+        :param using: Optional, alias of the engine rendering the jobs, the first engine which
+                      finds the template otherwise.
+        :type using: str
+
+        :param warm_templates: names of the templates to compile when a worker starts.
+        :type warm_templates: Iterable[str]
+
+        :param mp_context: Optional, the multiprocessing context, ``spawn`` by default so that the
+                           workers do not share the database connections of the current process.
+        """
+        self.workers_count = workers or app_settings.TEMPLATE_ENGINES_BULK_WORKERS
+        self.timeout = timeout if timeout is not None else app_settings.TEMPLATE_ENGINES_BULK_TIMEOUT
+        self.using = using
+        self.warm_templates = list(warm_templates)
+        self.mp_context = mp_context or multiprocessing.get_context('spawn')
+        self.workers = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        """
+        Starts the workers and waits until they are ready.
+        """
+        if not self.workers:
+            workers = [self.start_worker(wait_ready=False) for _ in range(self.workers_count)]
+            try:
+                for worker in workers:
+                    self.wait_ready(worker)
+            except RuntimeError:
+                for worker in workers:
+                    worker.kill()
+                raise
+            self.workers = workers
+
+    def start_worker(self, wait_ready=True):
+        worker = Worker(self.mp_context, self.using, self.warm_templates)
+        if wait_ready:
+            self.wait_ready(worker)
+        return worker
+
+    def wait_ready(self, worker):
+        """
+        Waits until a worker is set up, raises ``RuntimeError`` if it dies before.
+        """
+        try:
+            worker.conn.recv()
+        except (EOFError, OSError):
+            worker.process.join()
+            worker.kill()
+            raise RuntimeError(f'worker died while starting (exit code {worker.process.exitcode})')
+
+    def close(self):
+        """
+        Stops the workers.
+        """
+        for worker in self.workers:
+            worker.stop()
+        self.workers = []
+
+    def replace_worker(self, worker):
+        worker.kill()
+        self.workers[self.workers.index(worker)] = self.start_worker()
+
+    def render(self, jobs, ordered=True):
+        """
+        Renders the jobs and yields a ``BulkResult`` for each of them.
+
+        :param jobs: ``(template_name, context)`` tuples, read as the workers become free.
+        :type jobs: Iterable[Tuple[str, dict]]
+
+        :param ordered: ``True`` to yield the results in the order of the jobs, ``False`` to yield
+                        them as soon as they are rendered.
+        :type ordered: bool
+        """
+        self.start()
+        jobs = enumerate(jobs)
+        exhausted = False
+        results = {}
+        next_index = 0
+
+        try:
+            while True:
+                idle = [worker for worker in self.workers if worker.job is None]
+                while idle and not exhausted:
+                    try:
+                        index, (template_name, context) = next(jobs)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    idle.pop().send((index, template_name, context), self.timeout)
+
+                busy = [worker for worker in self.workers if worker.job is not None]
+                if not busy:
+                    break
+
+                for result in self.wait_results(busy):
+                    if ordered:
+                        results[result.index] = result
+                    else:
+                        yield result
+                while next_index in results:
+                    yield results.pop(next_index)
+                    next_index += 1
+        finally:
+            # the results of the jobs left running must not be read by the next call
+            for worker in [worker for worker in self.workers if worker.job is not None]:
+                self.replace_worker(worker)
+
+    def wait_results(self, busy):
+        """
+        Waits for at least one of the busy workers to end its job, returns the results.
+        """
+        deadlines = [worker.deadline for worker in busy if worker.deadline is not None]
+        timeout = max(min(deadlines) - time.monotonic(), 0) if deadlines else None
+        ready = wait([worker.conn for worker in busy] + [worker.process.sentinel for worker in busy], timeout)
+
+        results = []
+        now = time.monotonic()
+        for worker in busy:
+            index, template_name, _ = worker.job
+            error = None
+            if worker.conn in ready:
+                try:
+                    index, content, error = worker.conn.recv()
+                except (EOFError, OSError):
+                    worker.process.join()
+                    error = f'worker crashed (exit code {worker.process.exitcode})'
+                else:
+                    worker.job = None
+                    results.append(BulkResult(index, template_name, content, error))
+                    continue
+            elif worker.process.sentinel in ready:
+                worker.process.join()
+                error = f'worker crashed (exit code {worker.process.exitcode})'
+            elif worker.deadline is not None and worker.deadline <= now:
+                error = f'timed out after {self.timeout} seconds'
+            else:
+                continue
+            results.append(BulkResult(index, template_name, None, error))
+            self.replace_worker(worker)
+        return results
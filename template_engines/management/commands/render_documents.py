@@ -0,0 +1,187 @@
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.template import loader
+
+from template_engines.bulk import BulkRenderer
+
+
+def join_path(root, name):
+    """
+    Returns the path of ``name`` in ``root``, raises ``ValueError`` if it is not inside ``root``.
+    """
+    path = os.path.normpath(os.path.join(root, name))
+    relative_path = os.path.relpath(path, os.path.normpath(root))
+    if os.path.isabs(name) or relative_path in (os.curdir, os.pardir) or relative_path.startswith(os.pardir + os.sep):
+        raise ValueError(f'{name} is not inside the output')
+    return path
+
+
+class DirectoryWriter:
+    """
+    Writes the documents in a directory, each one through a temporary file so that an interrupted
+    run leaves no partial document.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # temporary files are only readable by their owner
+        umask = os.umask(0)
+        os.umask(umask)
+        self.mode = 0o666 & ~umask
+
+    def get_path(self, name):
+        return join_path(self.directory, name)
+
+    def exists(self, name):
+        return os.path.exists(self.get_path(name))
+
+    def write(self, name, content):
+        path = self.get_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as temporary_file:
+            temporary_file.write(content)
+        os.chmod(temporary_file.name, self.mode)
+        os.replace(temporary_file.name, path)
+
+
+class StorageWriter:
+    """
+    Writes the documents in the default storage, under a prefix.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+
+    def get_path(self, name):
+        return join_path(self.prefix, name)
+
+    def exists(self, name):
+        return default_storage.exists(self.get_path(name))
+
+    def write(self, name, content):
+        path = self.get_path(name)
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        default_storage.save(path, ContentFile(content))
+
+
+class Command(BaseCommand):
+    help = ("Renders a template with each context of a JSON lines file, one JSON object by line, and "
+            "writes the documents in a directory or in the default storage.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('template', help="Name of the template.")
+        parser.add_argument('--engine', help="Alias of the engine rendering the template.")
+        parser.add_argument('--input', default='-', help="JSON lines file, standard input by default.")
+        parser.add_argument('--output', required=True, help="Directory, or prefix in the storage, of the documents.")
+        parser.add_argument('--storage', action='store_true', help="Writes the documents in the default storage.")
+        parser.add_argument('--name', help="Name of the documents, formatted with the line number as {index} and "
+                                           "the keys of the context. '{index:06d}' and the template extension "
+                                           "by default.")
+        parser.add_argument('--workers', type=int, default=0,
+                            help="Number of worker processes, the documents are rendered by this process if 0.")
+        parser.add_argument('--timeout', type=float, help="Maximum duration of a document with workers, in seconds.")
+        parser.add_argument('--resume', action='store_true', help="Skips the documents which already exist.")
+
+    def handle(self, *args, **options):
+        template_name = options['template']
+        writer = StorageWriter(options['output']) if options['storage'] else DirectoryWriter(options['output'])
+        name_format = options['name'] or '{index:06d}' + self.get_extension(template_name)
+        self.rendered = self.skipped = self.failed = 0
+        start = time.monotonic()
+
+        input_file = sys.stdin if options['input'] == '-' else open(options['input'], 'r')
+        try:
+            jobs = self.read_jobs(input_file, name_format, writer, options['resume'])
+            if options['workers'] > 0:
+                self.render_in_workers(jobs, template_name, writer, options)
+            else:
+                self.render(jobs, template_name, writer, options['engine'])
+        finally:
+            if input_file is not sys.stdin:
+                input_file.close()
+
+        duration = time.monotonic() - start
+        self.stdout.write(
+            f"{self.rendered} documents rendered in {duration:.1f}s "
+            f"({self.rendered / duration if duration else 0:.1f} documents/s), "
+            f"{self.skipped} skipped, {self.failed} failed"
+        )
+
+    def get_extension(self, template_name):
+        path = Path(template_name)
+        # pdf templates are named like 'example.pdf.html'
+        if path.suffix.lower() == '.html' and path.suffixes and '.pdf' in path.suffixes[0]:
+            return '.pdf'
+        return path.suffix
+
+    def read_jobs(self, input_file, name_format, writer, resume):
+        """
+        Yields the line number, the name of the document and the context of each line, one at a time.
+        """
+        for index, line in enumerate(input_file, 1):
+            if not line.strip():
+                continue
+            try:
+                context = json.loads(line)
+                if not isinstance(context, dict):
+                    raise ValueError('the line is not a JSON object')
+                name = name_format.format(**dict(context, index=index))
+                # the names come from the input, they must not write anywhere else
+                writer.get_path(name)
+            except (ValueError, KeyError, IndexError, AttributeError, TypeError) as e:
+                self.fail(index, f'{type(e).__name__}: {e}')
+                continue
+            if resume and writer.exists(name):
+                self.skipped += 1
+                continue
+            yield index, name, context
+
+    def render(self, jobs, template_name, writer, engine):
+        try:
+            template = loader.get_template(template_name, using=engine)
+        except Exception as e:
+            raise CommandError(f'{type(e).__name__}: {e}')
+        for index, name, context in jobs:
+            try:
+                content = template.render(context)
+            except Exception as e:
+                self.fail(index, f'{type(e).__name__}: {e}')
+            else:
+                self.write(writer, name, content)
+
+    def render_in_workers(self, jobs, template_name, writer, options):
+        # only the jobs sent to the workers are kept
+        pending = {}
+
+        def bulk_jobs():
+            for job_index, (index, name, context) in enumerate(jobs):
+                pending[job_index] = (index, name)
+                yield template_name, context
+
+        renderer = BulkRenderer(workers=options['workers'], timeout=options['timeout'], using=options['engine'],
+                                warm_templates=[template_name])
+        with renderer:
+            for result in renderer.render(bulk_jobs(), ordered=False):
+                index, name = pending.pop(result.index)
+                if result.error:
+                    self.fail(index, result.error)
+                else:
+                    self.write(writer, name, result.content)
+
+    def write(self, writer, name, content):
+        writer.write(name, content)
+        self.rendered += 1
+
+    def fail(self, index, error):
+        self.failed += 1
+        self.stderr.write(f"Line {index}: {error}")
@@ -1,3 +1,5 @@
+import os
+
 from django.conf import settings
 
 ODT_ENGINE_SUB_DIRNAME = getattr(settings, 'ODT_ENGINE_SUB_DIRNAME', 'odt')
@@ -8,3 +10,17 @@ DOCX_ENGINE_APP_DIRNAME = getattr(settings, 'DOCX_ENGINE_APP_DIRNAME', 'template
 
 WEASYPRINT_ENGINE_SUB_DIRNAME = getattr(settings, 'DOCX_ENGINE_SUB_DIRNAME', 'pdf')
 WEASYPRINT_ENGINE_APP_DIRNAME = getattr(settings, 'DOCX_ENGINE_APP_DIRNAME', 'templates')
+
+TEMPLATE_ENGINES_CACHE_TEMPLATES = getattr(settings, 'TEMPLATE_ENGINES_CACHE_TEMPLATES', True)
+TEMPLATE_ENGINES_CACHE_MAX_SIZE = getattr(settings, 'TEMPLATE_ENGINES_CACHE_MAX_SIZE', 64 * 1024 * 1024)
+TEMPLATE_ENGINES_PATH_CACHE_TIMEOUT = getattr(settings, 'TEMPLATE_ENGINES_PATH_CACHE_TIMEOUT', 60)
+TEMPLATE_ENGINES_PATH_CACHE_MAX_ENTRIES = getattr(settings, 'TEMPLATE_ENGINES_PATH_CACHE_MAX_ENTRIES', 1024)
+TEMPLATE_ENGINES_SPOOL_MAX_SIZE = getattr(settings, 'TEMPLATE_ENGINES_SPOOL_MAX_SIZE', 10 * 1024 * 1024)
+TEMPLATE_ENGINES_FETCH_MAX_WORKERS = getattr(settings, 'TEMPLATE_ENGINES_FETCH_MAX_WORKERS', 8)
+TEMPLATE_ENGINES_ASSET_CACHE_MAX_SIZE = getattr(settings, 'TEMPLATE_ENGINES_ASSET_CACHE_MAX_SIZE', 32 * 1024 * 1024)
+TEMPLATE_ENGINES_ASSET_CACHE = getattr(settings, 'TEMPLATE_ENGINES_ASSET_CACHE', None)
+TEMPLATE_ENGINES_ASSET_CACHE_DEFAULT_TIMEOUT = getattr(settings, 'TEMPLATE_ENGINES_ASSET_CACHE_DEFAULT_TIMEOUT', 0)
+TEMPLATE_ENGINES_IMAGE_CACHE_MAX_SIZE = getattr(settings, 'TEMPLATE_ENGINES_IMAGE_CACHE_MAX_SIZE', 32 * 1024 * 1024)
+TEMPLATE_ENGINES_ASYNC_MAX_WORKERS = getattr(settings, 'TEMPLATE_ENGINES_ASYNC_MAX_WORKERS', 4)
+TEMPLATE_ENGINES_BULK_WORKERS = getattr(settings, 'TEMPLATE_ENGINES_BULK_WORKERS', os.cpu_count() or 1)
+TEMPLATE_ENGINES_BULK_TIMEOUT = getattr(settings, 'TEMPLATE_ENGINES_BULK_TIMEOUT', None)
@@ -2,15 +2,16 @@ import base64
 import logging
 import random
 import re
-import secrets
 
 from bs4 import BeautifulSoup
 from django import template
 from django.utils.safestring import mark_safe
 
-from template_engines.utils import get_content_url, get_extension_picture
+from template_engines.utils import get_content_url, get_extension_picture, get_picture_name
+from template_engines.utils.fetch import get_current_fetcher, get_current_image_options
+from template_engines.utils.images import get_picture_digest, get_response_digest, optimize_image
 from template_engines.utils.odt import ODT_IMAGE
-from .utils import parse_tag, resize, get_image_infos_from_uri
+from .utils import get_image_infos, parse_tag, resize, size_to_inches
 
 register = template.Library()
 
@@ -161,41 +162,108 @@ def parse_br(soup):
     return soup
 
 
+def get_img_infos(response, url):
+    """ get dimensions in the document and mime type of a fetched picture, None if it is not a picture """
+    if not response:
+        return None
+    try:
+        (width, height), mime_type = get_image_infos(response.content, get_response_digest(response))
+    except (OSError, ValueError):
+        logger.error(f"The picture with url : {url} is not a valid picture")
+        return None
+    if width > 500:
+        # if sized and sized > 500, it will not fit to page width
+        ratio = width / height
+        # keep ratio
+        width = 500
+        height = int(width / ratio)
+    return width, height, mime_type
+
+
+def get_img_frame(soup, src, infos):
+    """ get the draw:frame of a picture from its dimensions and mime type """
+    width, height, mime_type = infos
+    frame = soup.new_tag('draw:frame')
+    content = soup.new_tag('draw:image')
+    content.attrs = {
+        'xlink:href': src,
+        'xlink:type': "simple",
+        'xlink:show': "embed",
+        'xlink:actuate': "onload",
+        'draw:mime-type': mime_type
+    }
+    frame.attrs = {
+        'draw:style-name': "fr1",
+        'text:anchor-type': "as-char",
+        'svg:width': f"{width}px",
+        'svg:height': f"{height}px",
+        'draw:z-index': "37",
+    }
+    frame.append(content)
+    return frame
+
+
+def render_img_frame(src, response):
+    """ get the draw:frame of a fetched picture as a string, empty if it is not accessible """
+    infos = get_img_infos(response, src)
+    if infos is None:
+        return ""
+    return str(get_img_frame(BeautifulSoup('', 'html.parser'), src, infos))
+
+
 def parse_img(soup):
-    """ Replace img tags with text:p """
+    """ Replace img tags with draw:frame, removed if the picture is not accessible """
     imgs = soup.find_all("img")
+    fetcher = get_current_fetcher()
     for img in imgs:
-        img.name = 'draw:frame'
-        src = img.attrs.pop('src')
-        content = soup.new_tag('draw:image')
-        size, dimensions, mime_type = get_image_infos_from_uri(src)
-        content.attrs = {
-            'xlink:href': src,
-            'xlink:type': "simple",
-            'xlink:show': "embed",
-            'xlink:actuate': "onload",
-            'draw:mime-type': mime_type
-        }
-
-        width, height = dimensions
-        if width and width > 500:
-            # if sized and sized > 500, it will not fit to page width
-            ratio = width / height
-            # keep ratio
-            width = 500
-            height = int(width / ratio)
-        img.attrs = {
-            'draw:style-name': "fr1",
-            'text:anchor-type': "as-char",
-            'svg:width': f"{width}px",
-            'svg:height': f"{height}px",
-            'draw:z-index': "37",
-        }
-        img.append(content)
+        src = img.attrs.get('src', '')
+        if not src.lower().startswith('http'):
+            # protect from filesystem read
+            img.replace_with(get_img_frame(soup, src, (None, None, None)))
+        elif fetcher is not None:
+            # the picture is fetched once with the other ones, then embedded by the template
+            img.replace_with(fetcher.defer(src, "get", {}, lambda response, src=src: render_img_frame(src, response)))
+        else:
+            infos = get_img_infos(get_content_url(src, "get", {}), src)
+            if infos is None:
+                img.decompose()
+            else:
+                img.replace_with(get_img_frame(soup, src, infos))
 
     return soup
 
 
+def optimize_picture(picture, width, height, tag_options, digest=None):
+    """ Resample and re-encode a picture as set by the engine, overridden by the tag """
+    options = dict(get_current_image_options())
+    options.update((key, value) for key, value in tag_options.items() if value)
+    if not any(options.values()):
+        return picture
+    return optimize_image(picture, *size_to_inches(width, height), digest=digest, **options)
+
+
+def add_picture(picture, digest, images, max_width, max_height, anchor, image_options):
+    """ Add a picture to the images of the document, returns its frame """
+    width, height = resize(picture, max_width, max_height, odt=True, digest=digest)
+    optimized = optimize_picture(picture, width, height, image_options, digest)
+    if optimized is not picture:
+        picture, digest = optimized, get_picture_digest(optimized)
+    extension = get_extension_picture(picture, digest)
+    full_name = get_picture_name(picture, extension, digest)
+    images.update({full_name: picture})
+    return mark_safe(ODT_IMAGE.format(full_name, width, height, anchor or "paragraph",
+                                      f"image/{extension.lower()}"))
+
+
+def get_image_options_context(node, context):
+    """ Resolve the image options of a tag """
+    return {
+        'dpi': int(node.dpi.resolve(context)) if node.dpi else None,
+        'quality': int(node.quality.resolve(context)) if node.quality else None,
+        'format': node.format.resolve(context) if node.format else None,
+    }
+
+
 @register.filter()
 def from_html(value, is_safe=True):
     """ Convert HTML from rte fields to odt compatible format """
@@ -218,7 +286,7 @@ def from_html(value, is_safe=True):
 
 class ImageLoaderURLNode(template.Node):
     def __init__(self, url, data=None, request=None, max_width=None,
-                 max_height=None, anchor=None):
+                 max_height=None, anchor=None, dpi=None, quality=None, format=None):
         # saves the passed obj parameter for later use
         # this is a template.Variable, because that way it can be resolved
         # against the current context in the render method
@@ -228,21 +296,28 @@ class ImageLoaderURLNode(template.Node):
         self.max_width = max_width
         self.max_height = max_height
         self.anchor = anchor
+        self.dpi = dpi
+        self.quality = quality
+        self.format = format
 
     def render(self, context):
         url, type_request, max_width, max_height, anchor, data = self.get_value_context(context)
-        name = secrets.token_hex(15)
+        image_options = get_image_options_context(self, context)
+        images = context.setdefault('images', {})
+        fetcher = get_current_fetcher()
+        if fetcher is not None:
+            # the picture is fetched with the other ones once the template is rendered
+            return fetcher.defer(url, type_request or "get", data,
+                                 lambda response: self.render_picture(response, images, max_width, max_height, anchor,
+                                                                      image_options))
         response = get_content_url(url, type_request or "get", data)
+        return self.render_picture(response, images, max_width, max_height, anchor, image_options)
+
+    def render_picture(self, response, images, max_width, max_height, anchor, image_options=None):
         if not response:
             return ""
-        width, height = resize(response.content, max_width, max_height, odt=True)
-        context.setdefault('images', {})
-        picture = response.content
-        extension = get_extension_picture(picture)
-        full_name = '{}.{}'.format(name, extension)
-        context['images'].update({full_name: picture})
-        return mark_safe(ODT_IMAGE.format(full_name, width, height,
-                                          anchor or "paragraph", f"image/{extension.lower()}"))
+        return add_picture(response.content, get_response_digest(response), images, max_width, max_height, anchor,
+                           image_options or {})
 
     def get_value_context(self, context):
         final_url = self.url.resolve(context)
@@ -260,24 +335,28 @@ def image_url_loader(parser, token):
     Replace a tag by an image from the url you specified.
     The necessary key is url
     - url : Url where you want to get your picture
-    Other keys : data, max_width, max_height, request
+    Other keys : data, max_width, max_height, request, anchor, dpi, quality, format
     - data : Use it only with post request
     - max_width : Width of the picture rendered
     - max_heigth : Height of the picture rendered
     - request : Type of request, post or get. Get by default.
     - anchor : Type of anchor, paragraph, as-char, char, frame, page
+    - dpi : Pixels by inch of the embedded picture at its rendered size
+    - quality : Quality of the re-encoded picture
+    - format : Format of the re-encoded picture, jpeg, png...
     """
     tag_name, args, kwargs = parse_tag(token, parser)
     usage = '{{% {tag_name} [url] max_width="5000px" max_height="5000px" ' \
             'request="GET" data="{{"data": "example"}}" anchor="as-char" %}}'.format(tag_name=tag_name)
     if len(args) > 1 or not all(
-            key in ['max_width', 'max_height', 'request', 'data', 'anchor'] for key in kwargs.keys()):
+            key in ['max_width', 'max_height', 'request', 'data', 'anchor', 'dpi', 'quality', 'format']
+            for key in kwargs.keys()):
         raise template.TemplateSyntaxError("Usage: %s" % usage)
     return ImageLoaderURLNode(*args, **kwargs)
 
 
 class ImageLoaderNode(template.Node):
-    def __init__(self, instance, max_width=None, max_height=None, anchor=None):
+    def __init__(self, instance, max_width=None, max_height=None, anchor=None, dpi=None, quality=None, format=None):
         # saves the passed obj parameter for later use
         # this is a template.Variable, because that way it can be resolved
         # against the current context in the render method
@@ -285,6 +364,9 @@ class ImageLoaderNode(template.Node):
         self.max_width = max_width
         self.max_height = max_height
         self.anchor = anchor
+        self.dpi = dpi
+        self.quality = quality
+        self.format = format
 
     def base64_to_binary(self, picture):
         if isinstance(picture, str) and 'base64' in picture:
@@ -300,14 +382,8 @@ class ImageLoaderNode(template.Node):
             logger.error(f"{name} is not a valid picture")
             return ""
 
-        name = secrets.token_hex(15)
-        width, height = resize(picture, max_width, max_height, odt=True)
-        context.setdefault('images', {})
-        extension = get_extension_picture(picture)
-        full_name = '{}.{}'.format(name, extension)
-        context['images'].update({full_name: picture})
-        return mark_safe(ODT_IMAGE.format(full_name, width, height, anchor or "paragraph",
-                                          f"image/{extension.lower()}"))
+        return add_picture(picture, get_picture_digest(picture), context.setdefault('images', {}), max_width,
+                           max_height, anchor, get_image_options_context(self, context))
 
     def get_value_context(self, context):
         final_object = self.object.resolve(context)
@@ -325,15 +401,18 @@ def image_loader(parser, token):
     whose value is a byte object. You can also specify ``max_width`` and ``max_height``.
     The necessary key is image
     - image : content of your picture in binary or base64
-    Other keys : max_width, max_height, anchor
+    Other keys : max_width, max_height, anchor, dpi, quality, format
     - max_width : Width of the picture rendered
     - max_height : Height of the picture rendered
     - anchor : Type of anchor, paragraph, as-char, char, frame, page
+    - dpi : Pixels by inch of the embedded picture at its rendered size
+    - quality : Quality of the re-encoded picture
+    - format : Format of the re-encoded picture, jpeg, png...
     """
     tag_name, args, kwargs = parse_tag(token, parser)
     usage = '{{% {tag_name} [image] max_width="5000px" max_height="5000px" anchor="as-char" %}}'.format(
         tag_name=tag_name)
-    if len(args) > 1 or not all(key in ['max_width', 'max_height', 'anchor']
+    if len(args) > 1 or not all(key in ['max_width', 'max_height', 'anchor', 'dpi', 'quality', 'format']
                                 for key in kwargs.keys()):
         raise template.TemplateSyntaxError("Usage: %s" % usage)
     return ImageLoaderNode(*args, **kwargs)
@@ -4,6 +4,7 @@ from django import template
 from django.utils.safestring import mark_safe
 
 from template_engines.utils import get_content_url, get_extension_picture
+from template_engines.utils.fetch import get_current_fetcher
 from .utils import parse_tag
 
 register = template.Library()
@@ -23,7 +24,13 @@ class ImageLoaderURLNode(template.Node):
 
     def render(self, context):
         url, type_request, max_width, max_height, data = self.get_value_context(context)
-        response = get_content_url(url, type_request or "get", data)
+        fetcher = get_current_fetcher()
+        if fetcher is not None:
+            # the picture is fetched with the other ones once the template is rendered
+            return fetcher.defer(url, type_request or "get", data, self.render_picture)
+        return self.render_picture(get_content_url(url, type_request or "get", data))
+
+    def render_picture(self, response):
         if not response:
             return ""
         picture = response.content
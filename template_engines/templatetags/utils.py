@@ -1,10 +1,10 @@
 import re
-from io import BytesIO
-from urllib.request import urlopen
 
-from PIL import Image, ImageFile
 from django.template.base import FilterExpression, kwarg_re
 
+from template_engines.utils.fetch import fetch_content_url
+from template_engines.utils.images import probe_image
+
 DIM_REGEX = r'^(?P<v>(\d|\.)+)(?P<u>[a-z]*)$'
 
 DOCX_PAGE_WIDTH = 6120130
@@ -50,6 +50,13 @@ def size_parser(dim, odt=True):
         return CONV_MAPPING[unit](value) * 635
 
 
+def size_to_inches(width, height):
+    """
+    Convert the odt sizes given by `resize`, `{value}{unit}` or `dxa`, to inches.
+    """
+    return tuple((size_parser(dim) if isinstance(dim, str) else dim) / 1440 for dim in (width, height))
+
+
 def get_final_width_height(max_width, max_height, width, height):
     ratio = width / height
 
@@ -69,10 +76,9 @@ def get_final_width_height(max_width, max_height, width, height):
     return width, height
 
 
-def resize_keep_ratio(bimage, max_width, max_height, odt=True):
-    buffer = BytesIO(bimage)
-    with Image.open(buffer) as img_reader:
-        width, height = img_reader.size
+def resize_keep_ratio(bimage, max_width, max_height, odt=True, digest=None):
+    info = probe_image(bimage, digest)
+    width, height = info.width, info.height
 
     if odt:
         width, height = size_to_odt(width, height)
@@ -82,7 +88,7 @@ def resize_keep_ratio(bimage, max_width, max_height, odt=True):
     return final_width, final_height
 
 
-def resize(bimage, max_width, max_height, odt=True):
+def resize(bimage, max_width, max_height, odt=True, digest=None):
     """
     Resize the image with max_width or/and max_height has been specified,
     otherwise convert them.
@@ -98,20 +104,22 @@ def resize(bimage, max_width, max_height, odt=True):
 
     :param odt: Optional
     :type odt: boolean
+
+    :param digest: Optional, the digest of the image, see ``get_picture_digest``.
+    :type digest: str
     """
     if not max_width and not max_height:
-        buffer = BytesIO(bimage)
-        with Image.open(buffer) as img_reader:
-            width, height = img_reader.size
-            if odt:
-                width, height = size_to_odt(width, height)
+        info = probe_image(bimage, digest)
+        width, height = info.width, info.height
+        if odt:
+            width, height = size_to_odt(width, height)
         return width, height
 
     if max_width:
         max_width = size_parser(max_width, odt=odt)
     if max_height:
         max_height = size_parser(max_height, odt=odt)
-    width, height = resize_keep_ratio(bimage, max_width, max_height)
+    width, height = resize_keep_ratio(bimage, max_width, max_height, digest=digest)
 
     return f"{round(width / 1000, 2)}cm", f"{round(height / 1000, 2)}cm"
 
@@ -157,28 +165,24 @@ def parse_tag(token, parser):
 
 
 def get_image_infos_from_uri(uri):
-    """ get image size and dimensions """
+    """
+    get image size, dimensions and mime type, kept for compatibility: the picture is fetched
+    through the rendering in progress, use ``get_image_infos`` on a fetched picture instead.
+    """
     if not uri.lower().startswith('http'):
-        # protect use of urlopen from filesystem read
+        # protect from filesystem read
         return None, (None, None), None
+    response = fetch_content_url(uri, "get", {})
+    if not response:
+        return None, (None, None), None
+    try:
+        dimensions, mime_type = get_image_infos(response.content)
+    except (OSError, ValueError):
+        return len(response.content), (None, None), None
+    return len(response.content), dimensions, mime_type
+
 
-    file = urlopen(uri)
-    size = file.headers.get("content-length")
-    dimensions = (None, None)
-    mime_type = None
-
-    if size:
-        size = int(size)
-    p = ImageFile.Parser()
-    while True:
-        data = file.read(1024)
-        if not data:
-            break
-        p.feed(data)
-        if p.image:
-            dimensions = p.image.size
-            mime_type = f"image/{p.image.format.lower()}"
-            break
-
-    file.close()
-    return size, dimensions, mime_type
+def get_image_infos(picture, digest=None):
+    """ get image dimensions and mime type """
+    info = probe_image(picture, digest)
+    return (info.width, info.height), info.mime_type
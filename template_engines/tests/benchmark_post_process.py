@@ -0,0 +1,54 @@
+"""
+Compares the post-processing of a rendered ODT document by lxml with the BeautifulSoup one, on a
+document made of ``--paragraphs`` copies of the body of the test template.
+
+    DJANGO_SETTINGS_MODULE=test_template_engines.settings python -m template_engines.tests.benchmark_post_process
+"""
+import argparse
+import re
+import time
+
+import django
+
+
+def run(paragraphs, repeat):
+    from template_engines.backends.odt import OdtEngine
+    from template_engines.tests.settings import ODT_TEMPLATE_PATH, TEMPLATES_PATH
+    from template_engines.utils import get_rendered_by_xml, merge_rendered
+    from template_engines.utils.fetch import ImageFetcher
+
+    engine = OdtEngine({'NAME': 'odt', 'DIRS': [TEMPLATES_PATH], 'APP_DIRS': False, 'OPTIONS': {}})
+    content = engine.get_template_content(ODT_TEMPLATE_PATH)
+    # repeats the paragraphs of the body, after the declarations
+    body = re.search(r'</text:sequence-decls>(.*)</office:text>', content, re.S)
+    content = content[:body.start(1)] + body.group(1) * paragraphs + content[body.end(1):]
+    template = engine.from_string(content, template_path=ODT_TEMPLATE_PATH)
+    context = {'object': {'name': 'Michel & co', 'test': '<p>Some <strong>bold</strong> text</p><ul><li>item</li></ul>'}}
+
+    with ImageFetcher():
+        rendered = template.render_template(template.get_context(context))
+    print(f"content: {len(rendered['content.xml']) / 1024 / 1024:.1f} MB")
+
+    def soup_path():
+        context_ = template.get_context(context)
+        return get_rendered_by_xml(template.zip_root_files, template.process_soup(context_, merge_rendered(template.zip_root_files, rendered)))
+
+    def lxml_path():
+        return template.post_process(template.get_context(context), rendered)[0]
+
+    for name, func in (('BeautifulSoup', soup_path), ('lxml', lxml_path)):
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            durations.append(time.perf_counter() - start)
+        print(f"{name}: {min(durations) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paragraphs', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    django.setup()
+    run(args.paragraphs, args.repeat)
@@ -50,8 +50,15 @@ class DocxEngineTestCase(TestCase):
         template = self.docx_engine.get_template(DOCX_TEMPLATE_PATH)
         self.assertIsInstance(template, DocxTemplate)
         self.assertIsInstance(template.template, Template)
+        self.assertIs(template.templates['word/document.xml'], template.template)
         self.assertEqual(template.template_path, DOCX_TEMPLATE_PATH)
 
+    def test_is_static(self):
+        self.assertTrue(self.docx_engine.is_static('word/document.xml', '<w:r><w:rPr></w:rPr><w:t>Text</w:t></w:r>'))
+        self.assertFalse(self.docx_engine.is_static('word/document.xml', '<w:t>{{ object.name }}</w:t>'))
+        # changed by DocxTemplate.clean
+        self.assertFalse(self.docx_engine.is_static('word/document.xml', '<w:r><w:rPr></w:rPr><w:t>a\nb</w:t></w:r>'))
+
     def test_bad_template(self):
         with self.assertRaises(TemplateDoesNotExist):
             self.docx_engine.get_template(ODT_TEMPLATE_PATH)
@@ -67,6 +74,16 @@ class DocxEngineTestCase(TestCase):
             with open(DOCX_RENDERED_CONTENT_SCREENSHOT, 'r') as read_file:
                 self.assertEqual(zip_read_file.read('word/document.xml').decode(), read_file.read())
 
+    def test_render_many(self):
+        template = self.docx_engine.get_template(DOCX_TEMPLATE_PATH)
+        contexts = [{'object': {'name': name}} for name in ('Michel', 'Pierre')]
+        documents = list(template.render_many(contexts))
+        self.assertEqual(len(documents), 2)
+        for context, document in zip(contexts, documents):
+            with ZipFile(BytesIO(document), 'r') as zip_file, \
+                    ZipFile(BytesIO(template.render(context)), 'r') as expected:
+                self.assertEqual(zip_file.read('word/document.xml'), expected.read('word/document.xml'))
+
 
 class DocxTemplateTestCase(TestCase):
     def setUp(self):
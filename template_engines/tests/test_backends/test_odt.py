@@ -1,18 +1,28 @@
 import io
 import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from tempfile import TemporaryDirectory
 from unittest import mock
+from zipfile import ZipFile
 
+from PIL import Image
+from bs4 import BeautifulSoup
+from django.core.files.storage import FileSystemStorage
 from django.template import Template
 from django.template.exceptions import TemplateDoesNotExist
 from django.test import TestCase, RequestFactory
+from lxml import etree
 
 from template_engines.backends.odt import OdtEngine, OdtTemplate
+from template_engines.utils.archive import StreamBuffer
 from ..fake_app.models import Bidon
 from ..fake_app.views import OdtTemplateView
 from ..settings import (
     DOCX_TEMPLATE_PATH, IMAGE_PATH,
     TEMPLATES_PATH, ODT_TEMPLATE_PATH
 )
+from ..utils import get_response
 
 
 class OdtEngineTestCase(TestCase):
@@ -52,16 +62,380 @@ class OdtEngineTestCase(TestCase):
         with self.assertRaises(TemplateDoesNotExist):
             self.odt_engine.get_template_path('bad_name')
 
+    @mock.patch('django.core.files.storage.default_storage.exists', return_value=True)
+    def test_get_template_path_cached(self, mocked_exists):
+        self.assertEqual(self.odt_engine.get_template_path('template.odt'), 'template.odt')
+        self.assertEqual(self.odt_engine.get_template_path('template.odt'), 'template.odt')
+        self.assertEqual(mocked_exists.call_count, 1)
+
+        self.odt_engine.invalidate_template_path('template.odt')
+        self.odt_engine.get_template_path('template.odt')
+        self.assertEqual(mocked_exists.call_count, 2)
+
+    @mock.patch('django.core.files.storage.default_storage.exists', return_value=False)
+    def test_get_template_path_missing_cached(self, mocked_exists):
+        with self.assertRaises(TemplateDoesNotExist):
+            self.odt_engine.get_template_path('missing.odt')
+        calls = mocked_exists.call_count
+        self.assertEqual(calls, len(self.odt_engine.template_dirs) + 1)
+        with self.assertRaises(TemplateDoesNotExist):
+            self.odt_engine.get_template_path('missing.odt')
+        self.assertEqual(mocked_exists.call_count, calls)
+
+        self.odt_engine.reset()
+        with self.assertRaises(TemplateDoesNotExist):
+            self.odt_engine.get_template_path('missing.odt')
+        self.assertEqual(mocked_exists.call_count, calls * 2)
+
+    @mock.patch('django.core.files.storage.default_storage.exists', return_value=False)
+    def test_get_template_path_cache_disabled(self, mocked_exists):
+        self.odt_engine.path_cache.timeout = 0
+        for _ in range(2):
+            with self.assertRaises(TemplateDoesNotExist):
+                self.odt_engine.get_template_path('missing.odt')
+        self.assertEqual(mocked_exists.call_count, (len(self.odt_engine.template_dirs) + 1) * 2)
+
+    def test_get_template_removed_file(self):
+        self.odt_engine.get_template_path(ODT_TEMPLATE_PATH)
+        with mock.patch('django.core.files.storage.default_storage.size', side_effect=FileNotFoundError):
+            with self.assertRaises(TemplateDoesNotExist):
+                self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        self.assertEqual(len(self.odt_engine.path_cache), 0)
+
     def test_get_template_works(self):
         template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
         self.assertIsInstance(template, OdtTemplate)
         self.assertIsInstance(template.template, Template)
+        self.assertIs(template.templates['content.xml'], template.template)
         self.assertEqual(template.template_path, ODT_TEMPLATE_PATH)
 
     def test_bad_template(self):
         with self.assertRaises(TemplateDoesNotExist):
             self.odt_engine.get_template(DOCX_TEMPLATE_PATH)
 
+    def test_get_template_cached(self):
+        template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        with mock.patch.object(self.odt_engine, 'read_template_file') as mocked_read:
+            self.assertIs(self.odt_engine.get_template(ODT_TEMPLATE_PATH), template)
+            mocked_read.assert_not_called()
+
+    def test_get_template_cache_size(self):
+        template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        size = self.odt_engine.template_cache.size
+        # kept by the archive once read
+        styles = template.archive.read('styles.xml')
+        self.assertIs(self.odt_engine.get_template(ODT_TEMPLATE_PATH), template)
+        self.assertEqual(self.odt_engine.template_cache.size, size + len(styles))
+
+    def test_render_concurrently(self):
+        template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        with open(IMAGE_PATH, 'rb') as image_file:
+            image = image_file.read()
+
+        def render(index):
+            # the rendered members have a different size in each document
+            return template.render({'object': {'name': 'Michel' * index}, 'images': {'image.png': image}})
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            documents = list(executor.map(render, range(200)))
+        for document in documents:
+            with ZipFile(BytesIO(document), 'r') as zip_file:
+                self.assertIsNone(zip_file.testzip())
+
+    def test_render_does_not_read_storage(self):
+        template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        self.assertIsNotNone(template.archive)
+        with mock.patch('django.core.files.storage.default_storage.open') as mocked_open:
+            self.assertTrue(template.render({}))
+            mocked_open.assert_not_called()
+
+    @mock.patch('tempfile.NamedTemporaryFile', side_effect=AssertionError('no temporary file expected'))
+    def test_render_in_memory(self, mocked_temporary_file):
+        template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        with open(IMAGE_PATH, 'rb') as image_file:
+            self.assertTrue(template.render({'images': {'image.png': image_file.read()}}))
+
+    def test_render_to_stream(self):
+        template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        rendered = template.render({})
+        buffer = StreamBuffer()
+        template.render_to_stream({}, None, buffer)
+        with ZipFile(BytesIO(buffer.pop()), 'r') as stream_zip_file:
+            self.assertIsNone(stream_zip_file.testzip())
+            with ZipFile(BytesIO(rendered), 'r') as zip_file:
+                self.assertEqual(stream_zip_file.namelist(), zip_file.namelist())
+                self.assertEqual(stream_zip_file.read('content.xml'), zip_file.read('content.xml'))
+
+    def test_stream(self):
+        template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        chunks = list(template.stream({}))
+        with ZipFile(BytesIO(b''.join(chunks)), 'r') as stream_zip_file:
+            self.assertIsNone(stream_zip_file.testzip())
+            # one chunk by member and one for the central directory
+            self.assertEqual(len(chunks), len(stream_zip_file.namelist()) + 1)
+
+    @mock.patch('requests.Session.request')
+    def test_render_many(self, mocked_request):
+        with open(IMAGE_PATH, 'rb') as image_file:
+            mocked_request.return_value = get_response(image_file.read())
+        content = self.odt_engine.get_template_content(ODT_TEMPLATE_PATH).replace(
+            '{{ object.name }}', '{{ object.name }}{% image_url_loader "http://images.com/logo.png" %}')
+        template = self.odt_engine.from_string(content, template_path=ODT_TEMPLATE_PATH)
+        contexts = [{'object': {'name': name}} for name in ('Michel', 'Pierre', 'Paul')]
+
+        documents = list(template.render_many(iter(contexts)))
+
+        self.assertEqual(len(documents), 3)
+        # the picture is fetched once for the whole batch
+        self.assertEqual(mocked_request.call_count, 1)
+        for context, document in zip(contexts, documents):
+            with ZipFile(BytesIO(document), 'r') as zip_file, \
+                    ZipFile(BytesIO(template.render(context)), 'r') as expected:
+                self.assertEqual(zip_file.namelist(), expected.namelist())
+                for name in ('content.xml', 'styles.xml', 'META-INF/manifest.xml'):
+                    self.assertEqual(zip_file.read(name), expected.read(name))
+                self.assertIn(context['object']['name'], zip_file.read('content.xml').decode())
+
+    @mock.patch('requests.Session.request')
+    def test_stream_many(self, mocked_request):
+        with open(IMAGE_PATH, 'rb') as image_file:
+            mocked_request.return_value = get_response(image_file.read())
+        content = self.odt_engine.get_template_content(ODT_TEMPLATE_PATH).replace(
+            '{{ object.name }}', '{{ object.name }}{% image_url_loader "http://images.com/logo.png" %}')
+        template = self.odt_engine.from_string(content, template_path=ODT_TEMPLATE_PATH)
+        names = ['Michel', 'Pierre', 'Paul']
+
+        chunks = list(template.stream_many({'object': {'name': name}} for name in names))
+
+        # one chunk by document and one for the central directory
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(mocked_request.call_count, 1)
+        with ZipFile(BytesIO(b''.join(chunks)), 'r') as outer_zip_file:
+            self.assertIsNone(outer_zip_file.testzip())
+            self.assertEqual(outer_zip_file.namelist(), ['000001.odt', '000002.odt', '000003.odt'])
+            for filename, name in zip(outer_zip_file.namelist(), names):
+                with ZipFile(BytesIO(outer_zip_file.read(filename)), 'r') as zip_file:
+                    self.assertIn(name, zip_file.read('content.xml').decode())
+                    self.assertEqual(len([n for n in zip_file.namelist() if n.startswith('Pictures/')]), 1)
+
+    def test_stream_many_name(self):
+        template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        chunks = template.stream_many([{}, {}], name='certificates/{index}.odt')
+        with ZipFile(BytesIO(b''.join(chunks)), 'r') as outer_zip_file:
+            self.assertEqual(outer_zip_file.namelist(), ['certificates/1.odt', 'certificates/2.odt'])
+
+    def test_render_inputs(self):
+        template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        rendered = template.render({'object': {'name': 'Michel <b>Pierre</b>', 'test': '<p>para</p>'}})
+        with ZipFile(BytesIO(rendered), 'r') as zip_file:
+            content = zip_file.read('content.xml').decode()
+        self.assertNotIn('text:text-input', content)
+        # the paragraphs of an input go after its paragraph, with its style
+        self.assertIn('<text:p text:style-name="Standard">Bonjour <text:s/>!!</text:p>\n'
+                      'Michel &lt;b&gt;Pierre&lt;/b&gt;\naaaa\n<text:p text:style-name="Standard">para</text:p>',
+                      content)
+        self.assertEqual(content.count('<style:style style:family="text" style:name="BOLD">'), 1)
+
+    @mock.patch('random.randint', return_value=700527536680965024)
+    def test_render_inputs_not_well_formed(self, randint):
+        template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        context = {'object': {'name': "  Michel <b>l'a</b> &amp; \"b\"  &nbsp;",
+                              'test': '<p>a &amp; b</p>  <p> c&nbsp;&eacute; </p><ul><li>d</li></ul><strong>e</strong>'}}
+
+        def get_content(rendered):
+            with ZipFile(BytesIO(rendered), 'r') as zip_file:
+                # the serializations of lxml and BeautifulSoup differ
+                return etree.tostring(etree.fromstring(zip_file.read('content.xml')), method='c14n')
+
+        content = get_content(template.render(context))
+        # processed by html.parser, as a content which is not well formed
+        with mock.patch('template_engines.backends.odt.etree.fromstring',
+                        side_effect=etree.XMLSyntaxError('not well formed', None, 1, 1)):
+            rendered = template.render(context)
+        self.assertEqual(get_content(rendered), content)
+        self.assertIn(b'\n  Michel &lt;b&gt;l\'a&lt;/b&gt; &amp;amp; "b"  &amp;nbsp;\naaaa\n', content)
+
+    def test_automatic_styles_compiled(self):
+        template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        source = template.templates['content.xml'].source
+        self.assertEqual(source.count('style:name="BOLD"'), 1)
+        self.assertEqual(source.count('style:name="L2"'), 1)
+
+    def test_add_automatic_styles(self):
+        styles = ''.join(style for name, style in OdtTemplate.get_automatic_styles() if name != 'BOLD')
+        bold = dict(OdtTemplate.get_automatic_styles())['BOLD']
+        # styles already defined are kept
+        content = f'<office:automatic-styles>{bold}</office:automatic-styles><office:body/>'
+        self.assertEqual(self.odt_engine.add_automatic_styles(content),
+                         f'<office:automatic-styles>{bold}{styles}</office:automatic-styles><office:body/>')
+        self.assertEqual(self.odt_engine.add_automatic_styles('<office:automatic-styles/><office:body/>'),
+                         f'<office:automatic-styles>{bold}{styles}</office:automatic-styles><office:body/>')
+        self.assertEqual(self.odt_engine.add_automatic_styles('<office:scripts/><office:body/>'),
+                         f'<office:scripts/><office:automatic-styles>{bold}{styles}</office:automatic-styles>'
+                         '<office:body/>')
+
+    def test_add_automatic_styles_same_name(self):
+        styles = dict(OdtTemplate.get_automatic_styles())
+        # defined the same way, with the attributes in another order
+        bold = ('<style:style style:family="text" style:name="BOLD"><style:text-properties '
+                'style:font-weight-complex="bold" fo:font-weight="bold" style:font-weight-asian="bold"/></style:style>')
+        # list style of the template, the lists of from_html need their own
+        list_style = ('<text:list-style style:name="L1"><text:list-level-style-number text:level="1" '
+                      'style:num-format="1"/></text:list-style>')
+        content = self.odt_engine.add_automatic_styles(
+            f'<office:automatic-styles>{bold}{list_style}</office:automatic-styles><office:body/>')
+        self.assertEqual(content.count('style:name="BOLD"'), 1)
+        self.assertIn(list_style, content)
+        self.assertIn(styles['L1'], content)
+
+    def test_clean_deprecated(self):
+        template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        soup = BeautifulSoup('<office:automatic-styles></office:automatic-styles><office:body></office:body>',
+                             'html.parser')
+        with self.assertWarns(DeprecationWarning):
+            soup = template.clean(soup)
+        self.assertEqual(len(soup.find('office:automatic-styles').contents), len(OdtTemplate.get_automatic_styles()))
+
+    def test_static_members(self):
+        template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        # styles.xml has no template syntax
+        self.assertEqual(list(template.templates), ['content.xml'])
+        rendered = template.render({'object': {'name': 'Michel'}})
+        with ZipFile(os.path.join(TEMPLATES_PATH, ODT_TEMPLATE_PATH), 'r') as template_file, \
+                ZipFile(BytesIO(rendered), 'r') as zip_file:
+            self.assertEqual(zip_file.read('styles.xml'), template_file.read('styles.xml'))
+            self.assertEqual(zip_file.getinfo('styles.xml').compress_size,
+                             template_file.getinfo('styles.xml').compress_size)
+
+    def test_is_static(self):
+        styles = ''.join(style for name, style in OdtTemplate.get_automatic_styles())
+        self.assertTrue(self.odt_engine.is_static('styles.xml', '<office:document-styles/>'))
+        self.assertFalse(self.odt_engine.is_static('styles.xml', '<text:p>{{ object.name }}</text:p>'))
+        self.assertFalse(self.odt_engine.is_static('styles.xml', '<text:p>{% now "Y" %}</text:p>'))
+        self.assertFalse(self.odt_engine.is_static('styles.xml', '<text:p><text:text-input>a</text:text-input></text:p>'))
+        self.assertFalse(self.odt_engine.is_static(
+            'styles.xml', '<draw:frame><draw:image xlink:href="http://images.com/logo.png"/></draw:frame>'))
+        self.assertTrue(self.odt_engine.is_static(
+            'styles.xml', '<draw:frame><draw:image xlink:href="Pictures/logo.png"/></draw:frame>'))
+        # the styles for html filters are missing
+        self.assertFalse(self.odt_engine.is_static('content.xml', '<office:automatic-styles/><office:body/>'))
+        self.assertTrue(self.odt_engine.is_static(
+            'content.xml', f'<office:automatic-styles>{styles}</office:automatic-styles><office:body/>'))
+
+    def test_render_not_well_formed(self):
+        content = self.odt_engine.get_template_content(ODT_TEMPLATE_PATH).replace(
+            '{{ object.name }}', '{{ object.name|safe }}')
+        template = self.odt_engine.from_string(content, template_path=ODT_TEMPLATE_PATH)
+        with mock.patch.object(template, 'process_soup', wraps=template.process_soup) as process_soup:
+            rendered = template.render({'object': {'name': 'Michel<br>Pierre'}})
+        # processed by html.parser
+        self.assertEqual(process_soup.call_count, 1)
+        with ZipFile(BytesIO(rendered), 'r') as zip_file:
+            self.assertIn('Pierre', zip_file.read('content.xml').decode())
+
+    @mock.patch('requests.Session.request')
+    def test_render_merged(self, mocked_request):
+        with open(IMAGE_PATH, 'rb') as image_file:
+            mocked_request.return_value = get_response(image_file.read())
+        content = self.odt_engine.get_template_content(ODT_TEMPLATE_PATH).replace(
+            '{{ object.name }}', '{{ object.name }}{% image_url_loader "http://images.com/logo.png" %}')
+        template = self.odt_engine.from_string(content, template_path=ODT_TEMPLATE_PATH)
+        names = ['Michel', 'Pierre', 'Paul']
+
+        document = template.render_merged({'object': {'name': name}} for name in names)
+
+        self.assertEqual(mocked_request.call_count, 1)
+        with ZipFile(BytesIO(document), 'r') as zip_file:
+            self.assertIsNone(zip_file.testzip())
+            self.assertEqual(len([n for n in zip_file.namelist() if n.startswith('Pictures/')]), 1)
+            self.assertEqual(zip_file.read('META-INF/manifest.xml').decode().count('Pictures/'), 1)
+            content = zip_file.read('content.xml').decode()
+        self.assertTrue(content.startswith('<?xml'))
+        self.assertEqual(content.count('<office:text>'), 1)
+        self.assertEqual(content.count('<text:sequence-decls>'), 1)
+        self.assertEqual(content.count('<text:p text:style-name="PAGE_BREAK"/>'), 2)
+        self.assertIn('<style:paragraph-properties fo:break-before="page"/>', content)
+        positions = [content.index(name) for name in names]
+        self.assertEqual(positions, sorted(positions))
+
+    def test_render_merged_not_well_formed(self):
+        content = self.odt_engine.get_template_content(ODT_TEMPLATE_PATH).replace(
+            '{{ object.name }}', '{{ object.name|safe }}')
+        template = self.odt_engine.from_string(content, template_path=ODT_TEMPLATE_PATH)
+        # an empty namespace declaration is an error for lxml
+        names = ['Michel<text:span xmlns:q="">Pierre</text:span>', 'Paul<text:span xmlns:q="">Jacques</text:span>',
+                 'Louis']
+
+        document = template.render_merged({'object': {'name': name}} for name in names)
+
+        with ZipFile(BytesIO(document), 'r') as zip_file:
+            content = zip_file.read('content.xml').decode()
+        # the records which are not well formed are kept as html.parser outputs them
+        for name in names:
+            self.assertIn(name, content)
+        self.assertEqual(content.count('<text:sequence-decls>'), 1)
+        self.assertEqual(content.count('<text:p text:style-name="PAGE_BREAK"/>'), 2)
+
+    def test_stream_merged(self):
+        template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        contexts = [{'object': {'name': 'Michel'}}, {'object': {'name': 'Pierre'}}]
+
+        chunks = list(template.stream_merged(iter(contexts)))
+
+        # one chunk by record and one for the last members and the central directory
+        self.assertEqual(len(chunks), 3)
+        with ZipFile(BytesIO(b''.join(chunks)), 'r') as zip_file:
+            self.assertIsNone(zip_file.testzip())
+            content = zip_file.read('content.xml').decode()
+        self.assertIn('Michel', content)
+        self.assertIn('Pierre', content)
+
+    def test_render_merged_without_context(self):
+        template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        with self.assertRaises(ValueError):
+            template.render_merged([])
+
+    def test_render_to_storage(self):
+        with TemporaryDirectory() as directory:
+            storage = FileSystemStorage(location=directory)
+            name, size = self.odt_engine.render_to_storage(ODT_TEMPLATE_PATH, {}, storage, 'output.odt')
+            self.assertEqual(name, 'output.odt')
+            self.assertEqual(storage.size(name), size)
+            with storage.open(name, 'rb') as output_file:
+                with ZipFile(output_file, 'r') as zip_file:
+                    self.assertIsNone(zip_file.testzip())
+
+    @mock.patch('template_engines.settings.TEMPLATE_ENGINES_SPOOL_MAX_SIZE', 10)
+    def test_render_to_storage_spooled_on_disk(self):
+        with TemporaryDirectory() as directory:
+            storage = FileSystemStorage(location=directory)
+            name, size = self.odt_engine.render_to_storage(ODT_TEMPLATE_PATH, {}, storage, 'output.odt')
+            self.assertEqual(storage.size(name), size)
+
+    def test_get_template_cache_outdated(self):
+        template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        with mock.patch('django.core.files.storage.default_storage.get_modified_time') as mocked_time:
+            mocked_time.return_value = None
+            # not checked until the path cache timeout
+            self.assertIs(self.odt_engine.get_template(ODT_TEMPLATE_PATH), template)
+            mocked_time.assert_not_called()
+            self.odt_engine.path_cache_timeout = 0
+            new_template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        self.assertIsNot(new_template, template)
+
+    def test_get_template_path_cache_max_entries(self):
+        self.odt_engine.path_cache.max_entries = 2
+        for name in ('a.odt', 'b.odt', 'c.odt'):
+            with self.assertRaises(TemplateDoesNotExist):
+                self.odt_engine.get_template_path(name)
+        self.assertEqual(len(self.odt_engine.path_cache), 2)
+
+    def test_get_template_cache_disabled(self):
+        self.odt_engine.cache_templates = False
+        template = self.odt_engine.get_template(ODT_TEMPLATE_PATH)
+        self.assertIsNot(self.odt_engine.get_template(ODT_TEMPLATE_PATH), template)
+        self.assertEqual(len(self.odt_engine.template_cache), 0)
+
 
 class OdtTemplateTestCase(TestCase):
     def setUp(self):
@@ -89,22 +463,57 @@ class OdtTemplateTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTrue(response.content)
 
-    @mock.patch('requests.get',)
-    @mock.patch('template_engines.templatetags.utils.urlopen')
-    def test_view_works_with_from_html_with_image(self, mock_url, mocked_get):
-        mocked_get.return_value.status_code = 200
+    @mock.patch('requests.Session.request')
+    def test_view_works_with_from_html_with_image(self, mocked_request):
         with open(IMAGE_PATH, 'rb') as image_file:
-            mocked_get.return_value.content = image_file.read()
-        image_file = open(IMAGE_PATH, 'rb')
-        mock_url.return_value = image_file
-        setattr(image_file, 'headers', {'content-length': 100})
+            mocked_request.return_value = get_response(image_file.read())
         OdtTemplateView.template_name = os.path.join(TEMPLATES_PATH, 'html.odt')
         obj = Bidon.objects.create(name='<img src="http://images.com/monimage.jpeg">')
         response = OdtTemplateView.as_view()(self.request, **{'pk': obj.pk}).render()
-        image_file.close()
         self.assertEqual(response.status_code, 200)
         self.assertTrue(response.content)
 
+    @mock.patch('requests.Session.request')
+    def test_render_same_image_embedded_once(self, mocked_request):
+        with open(IMAGE_PATH, 'rb') as image_file:
+            mocked_request.return_value = get_response(image_file.read())
+        template = OdtEngine({'NAME': 'odt', 'DIRS': [TEMPLATES_PATH], 'APP_DIRS': False,
+                              'OPTIONS': {}}).get_template('html.odt')
+        image = '<img src="http://images.com/monimage.png">'
+        rendered = template.render({'object': {'name': image * 3}})
+        with ZipFile(BytesIO(rendered), 'r') as zip_file:
+            pictures = [name for name in zip_file.namelist() if name.startswith('Pictures/')]
+            self.assertEqual(len(pictures), 1)
+            self.assertEqual(zip_file.read('content.xml').decode().count(pictures[0]), 3)
+            self.assertEqual(zip_file.read('META-INF/manifest.xml').decode().count(pictures[0]), 1)
+
+    @mock.patch('requests.Session.request')
+    def test_render_from_html_image_fetched_once(self, mocked_request):
+        with open(IMAGE_PATH, 'rb') as image_file:
+            mocked_request.return_value = get_response(image_file.read())
+        template = OdtEngine({'NAME': 'odt', 'DIRS': [TEMPLATES_PATH], 'APP_DIRS': False,
+                              'OPTIONS': {}}).get_template('html.odt')
+        rendered = template.render({'object': {'name': '<img src="http://images.com/monimage.png">'}})
+        self.assertEqual(mocked_request.call_count, 1)
+        with ZipFile(BytesIO(rendered), 'r') as zip_file:
+            content = zip_file.read('content.xml').decode()
+        self.assertIn('svg:height="136px" svg:width="394px"', content)
+        self.assertIn('draw:mime-type="image/png"', content)
+        self.assertNotIn('[[image-', content)
+
+    @mock.patch('requests.Session.request')
+    def test_render_from_html_image_options(self, mocked_request):
+        with open(IMAGE_PATH, 'rb') as image_file:
+            mocked_request.return_value = get_response(image_file.read())
+        template = OdtEngine({'NAME': 'odt', 'DIRS': [TEMPLATES_PATH], 'APP_DIRS': False,
+                              'OPTIONS': {'images': {'dpi': 48}}}).get_template('html.odt')
+        rendered = template.render({'object': {'name': '<img src="http://images.com/monimage.png">'}})
+        with ZipFile(BytesIO(rendered), 'r') as zip_file:
+            picture, = [zip_file.read(name) for name in zip_file.namelist() if name.startswith('Pictures/')]
+        with Image.open(BytesIO(picture)) as image:
+            # displayed at 96 dpi
+            self.assertEqual(image.size, (197, 68))
+
     def test_view_works_with_bold_text(self):
         OdtTemplateView.template_name = os.path.join(TEMPLATES_PATH, 'works.odt')
         obj = Bidon.objects.create(name='Michel <b>Pierre</b>')
@@ -0,0 +1,95 @@
+import os
+import time
+from io import BytesIO
+from unittest import mock
+from zipfile import ZipFile
+
+from django.test import SimpleTestCase
+
+from template_engines.bulk import BulkRenderer
+from template_engines.tests.settings import ODT_TEMPLATE_PATH
+
+
+class Slow:
+    def __str__(self):
+        time.sleep(10)
+        return 'slow'
+
+
+class Crash:
+    def __str__(self):
+        os._exit(3)
+
+
+class BulkRendererTestCase(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.renderer = BulkRenderer(workers=2, timeout=5, using='odt', warm_templates=[ODT_TEMPLATE_PATH])
+        cls.renderer.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.renderer.close()
+        super().tearDownClass()
+
+    def assertRendered(self, result, name):
+        self.assertIsNone(result.error)
+        with ZipFile(BytesIO(result.content), 'r') as zip_file:
+            self.assertIn(name, zip_file.read('content.xml').decode())
+
+    def test_render_ordered(self):
+        names = [f'Name {i}' for i in range(6)]
+        results = list(self.renderer.render((ODT_TEMPLATE_PATH, {'object': {'name': name}}) for name in names))
+        self.assertEqual([result.index for result in results], list(range(6)))
+        for result, name in zip(results, names):
+            self.assertEqual(result.template_name, ODT_TEMPLATE_PATH)
+            self.assertRendered(result, name)
+
+    def test_render_unordered(self):
+        results = list(self.renderer.render([(ODT_TEMPLATE_PATH, {'object': {'name': 'Michel'}})] * 4,
+                                            ordered=False))
+        self.assertEqual(sorted(result.index for result in results), [0, 1, 2, 3])
+
+    def test_failures_are_isolated(self):
+        jobs = [
+            ('unknown.odt', {}),
+            (ODT_TEMPLATE_PATH, {'object': {'name': Crash()}}),
+            (ODT_TEMPLATE_PATH, {'object': {'name': 'Michel'}}),
+        ]
+        results = list(self.renderer.render(jobs))
+        self.assertIsNone(results[0].content)
+        self.assertTrue(results[0].error)
+        self.assertEqual(results[1].error, 'worker crashed (exit code 3)')
+        self.assertRendered(results[2], 'Michel')
+
+    def test_render_stopped(self):
+        results = self.renderer.render([
+            (ODT_TEMPLATE_PATH, {'object': {'name': 'Michel'}}),
+            (ODT_TEMPLATE_PATH, {'object': {'name': Slow()}}),
+        ], ordered=False)
+        self.assertRendered(next(results), 'Michel')
+        results.close()
+        # the worker of the job left running is replaced
+        self.assertTrue(all(worker.job is None for worker in self.renderer.workers))
+        result, = self.renderer.render([(ODT_TEMPLATE_PATH, {'object': {'name': 'Pierre'}})])
+        self.assertEqual(result.index, 0)
+        self.assertRendered(result, 'Pierre')
+
+    def test_worker_dies_while_starting(self):
+        renderer = BulkRenderer(workers=1, using='odt')
+        with mock.patch.dict(os.environ, {'DJANGO_SETTINGS_MODULE': 'unknown_settings'}), \
+                self.assertRaisesMessage(RuntimeError, 'worker died while starting (exit code 1)'):
+            renderer.start()
+        self.assertEqual(renderer.workers, [])
+
+    def test_timeout(self):
+        renderer = BulkRenderer(workers=1, timeout=0.5, using='odt')
+        with renderer:
+            results = list(renderer.render([
+                (ODT_TEMPLATE_PATH, {'object': {'name': Slow()}}),
+                (ODT_TEMPLATE_PATH, {'object': {'name': 'Michel'}}),
+            ]))
+        self.assertEqual(results[0].error, 'timed out after 0.5 seconds')
+        self.assertRendered(results[1], 'Michel')
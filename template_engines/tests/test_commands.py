@@ -0,0 +1,121 @@
+import io
+import json
+import os
+import stat
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from unittest import mock
+from zipfile import ZipFile
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from template_engines.tests.settings import ODT_TEMPLATE_PATH
+
+
+class RenderDocumentsTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.output = os.path.join(self.directory.name, 'output')
+        self.input = os.path.join(self.directory.name, 'contexts.jsonl')
+        with open(self.input, 'w') as input_file:
+            for name in ('Michel', 'Pierre', 'Paul'):
+                input_file.write(json.dumps({'slug': name.lower(), 'object': {'name': name}}) + '\n')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def call_command(self, *args):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('render_documents', ODT_TEMPLATE_PATH, '--engine', 'odt', '--input', self.input,
+                     '--output', self.output, *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def read_content(self, name):
+        with open(os.path.join(self.output, name), 'rb') as document:
+            with ZipFile(BytesIO(document.read()), 'r') as zip_file:
+                return zip_file.read('content.xml').decode()
+
+    def test_render(self):
+        stdout, stderr = self.call_command()
+        self.assertEqual(sorted(os.listdir(self.output)), ['000001.odt', '000002.odt', '000003.odt'])
+        self.assertIn('Pierre', self.read_content('000002.odt'))
+        self.assertIn('3 documents rendered', stdout)
+        self.assertIn('0 skipped, 0 failed', stdout)
+        self.assertEqual(stderr, '')
+
+    def test_name_and_failures(self):
+        with open(self.input, 'a') as input_file:
+            input_file.write('\n{"object": \n')
+        stdout, stderr = self.call_command('--name', 'documents/{slug}.odt')
+        self.assertEqual(sorted(os.listdir(os.path.join(self.output, 'documents'))),
+                         ['michel.odt', 'paul.odt', 'pierre.odt'])
+        self.assertIn('3 documents rendered', stdout)
+        self.assertIn('1 failed', stdout)
+        self.assertTrue(stderr.startswith('Line 5: JSONDecodeError'))
+
+    def test_invalid_lines(self):
+        with open(self.input, 'a') as input_file:
+            input_file.write('[1]\n"x"\n')
+            input_file.write(json.dumps({'slug': 'index', 'index': 'a', 'object': {'name': 'Louis'}}) + '\n')
+        stdout, stderr = self.call_command('--name', '{slug}-{index}.odt')
+        self.assertEqual(sorted(os.listdir(self.output)),
+                         ['index-6.odt', 'michel-1.odt', 'paul-3.odt', 'pierre-2.odt'])
+        self.assertIn('4 documents rendered', stdout)
+        self.assertIn('2 failed', stdout)
+        self.assertIn('Line 4: ValueError', stderr)
+        self.assertIn('Line 5: ValueError', stderr)
+
+    def test_name_cannot_be_formatted(self):
+        stdout, stderr = self.call_command('--name', '{object.name}.odt')
+        self.assertIn('0 documents rendered', stdout)
+        self.assertIn('3 failed', stdout)
+        self.assertIn('Line 1: AttributeError', stderr)
+
+    def test_name_outside_output(self):
+        with open(self.input, 'a') as input_file:
+            for slug in ('../outside', '/tmp/outside', 'documents/../..', ''):
+                input_file.write(json.dumps({'slug': slug, 'object': {'name': 'Louis'}}) + '\n')
+        stdout, stderr = self.call_command('--name', '{slug}', '--resume')
+        self.assertEqual(sorted(os.listdir(self.output)), ['michel', 'paul', 'pierre'])
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ['contexts.jsonl', 'output'])
+        self.assertIn('3 documents rendered', stdout)
+        self.assertIn('4 failed', stdout)
+        self.assertIn('Line 4: ValueError: ../outside is not inside the output', stderr)
+        self.assertIn('Line 5: ValueError: /tmp/outside is not inside the output', stderr)
+
+    @mock.patch('template_engines.management.commands.render_documents.default_storage')
+    def test_storage_name_outside_output(self, storage):
+        storage.exists.return_value = False
+        with open(self.input, 'a') as input_file:
+            input_file.write(json.dumps({'slug': '../outside', 'object': {'name': 'Louis'}}) + '\n')
+        stdout, stderr = self.call_command('--name', '{slug}.odt', '--storage')
+        self.assertEqual(sorted(args[0] for args, kwargs in storage.save.call_args_list),
+                         [os.path.join(self.output, name) for name in ('michel.odt', 'paul.odt', 'pierre.odt')])
+        self.assertIn('1 failed', stdout)
+        self.assertIn('Line 4: ValueError: ../outside.odt is not inside the output', stderr)
+
+    def test_file_permissions(self):
+        umask = os.umask(0o022)
+        try:
+            self.call_command()
+        finally:
+            os.umask(umask)
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.join(self.output, '000001.odt')).st_mode), 0o644)
+
+    def test_resume(self):
+        os.makedirs(self.output)
+        with open(os.path.join(self.output, '000001.odt'), 'wb') as document:
+            document.write(b'already rendered')
+        stdout, _ = self.call_command('--resume')
+        self.assertIn('2 documents rendered', stdout)
+        self.assertIn('1 skipped', stdout)
+        with open(os.path.join(self.output, '000001.odt'), 'rb') as document:
+            self.assertEqual(document.read(), b'already rendered')
+
+    def test_workers(self):
+        stdout, stderr = self.call_command('--workers', '2', '--timeout', '30')
+        self.assertEqual(sorted(os.listdir(self.output)), ['000001.odt', '000002.odt', '000003.odt'])
+        self.assertIn('Paul', self.read_content('000003.odt'))
+        self.assertIn('3 documents rendered', stdout)
@@ -0,0 +1,213 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO
+from unittest import mock
+from socketserver import ThreadingMixIn
+from zipfile import ZipFile
+
+from django.test import TestCase
+
+from template_engines.backends.docx import DocxEngine
+from template_engines.backends.odt import OdtEngine
+from template_engines.tests.settings import DOCX_TEMPLATE_PATH, IMAGE_PATH, ODT_TEMPLATE_PATH, TEMPLATES_PATH
+from template_engines.tests.utils import get_response
+from template_engines.utils.fetch import ImageFetcher, fetch_content_url, get_current_fetcher
+
+
+class ImageFetcherTestCase(TestCase):
+
+    @mock.patch('template_engines.utils.fetch.get_content_url')
+    def test_fetch_in_parallel(self, mocked_get):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def get_content_url(url, type_request, data, client=None):
+            # fails if the three pictures are not fetched at the same time
+            barrier.wait()
+            return url
+
+        mocked_get.side_effect = get_content_url
+        fetcher = ImageFetcher(max_workers=3)
+        for url in ('http://a', 'http://b', 'http://c'):
+            fetcher.add(url)
+        fetcher.fetch()
+        self.assertEqual(fetcher.get('http://b'), 'http://b')
+        self.assertEqual(mocked_get.call_count, 3)
+
+    @mock.patch('template_engines.utils.fetch.get_content_url')
+    def test_afetch_bounded(self, mocked_get):
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def get_content_url(url, type_request, data, client=None):
+            with lock:
+                running.append(url)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(url)
+            return url
+
+        mocked_get.side_effect = get_content_url
+        fetcher = ImageFetcher(max_workers=2)
+        for index in range(6):
+            fetcher.add(f'http://{index}')
+        loop = asyncio.new_event_loop()
+        try:
+            with mock.patch.object(loop, 'run_in_executor', wraps=loop.run_in_executor) as run_in_executor:
+                loop.run_until_complete(fetcher.afetch())
+        finally:
+            loop.close()
+        self.assertEqual(fetcher.get('http://5'), 'http://5')
+        self.assertEqual(mocked_get.call_count, 6)
+        self.assertLessEqual(max(peak), 2)
+        # not in the default executor of the loop
+        self.assertNotIn(None, [call[0][0] for call in run_in_executor.call_args_list])
+
+    @mock.patch('template_engines.utils.fetch.get_content_url', side_effect=lambda url, *args: url.upper())
+    def test_defer_and_resolve(self, mocked_get):
+        fetcher = ImageFetcher()
+        rendered = '{} {} {}'.format(
+            fetcher.defer('http://a', 'get', '', lambda response: f'<{response}>'),
+            fetcher.defer('http://b', 'GET', '', lambda response: f'({response})'),
+            fetcher.defer('http://a', 'get', '', lambda response: f'[{response}]'),
+        )
+        self.assertEqual(mocked_get.call_count, 0)
+        self.assertEqual(fetcher.resolve(rendered), '<HTTP://A> (HTTP://B) [HTTP://A]')
+        self.assertEqual(mocked_get.call_count, 2)
+
+    @mock.patch('template_engines.utils.fetch.get_content_url', return_value='response')
+    def test_current_fetcher(self, mocked_get):
+        self.assertIsNone(get_current_fetcher())
+        with ImageFetcher() as fetcher:
+            self.assertIs(get_current_fetcher(), fetcher)
+            fetch_content_url('http://a', 'get', {})
+            fetch_content_url('http://a', 'get', {})
+        self.assertIsNone(get_current_fetcher())
+        self.assertEqual(mocked_get.call_count, 1)
+
+    @mock.patch('template_engines.utils.fetch.get_content_url', side_effect=lambda url, *args: url.upper())
+    def test_release(self, mocked_get):
+        fetcher = ImageFetcher()
+        fetcher.get('http://a')
+        fetcher.get('http://b')
+        fetcher.release()
+        fetcher.get('http://a')
+        fetcher.release()
+        self.assertEqual(list(fetcher.responses), [fetcher.get_key('http://a', 'get', None)])
+        fetcher.get('http://a')
+        fetcher.get('http://b')
+        self.assertEqual(mocked_get.call_count, 3)
+
+
+class OdtPrefetchTestCase(TestCase):
+
+    @mock.patch('requests.Session.request')
+    def test_render_image_url_loader_in_loop(self, mocked_request):
+        with open(IMAGE_PATH, 'rb') as image_file:
+            mocked_request.return_value = get_response(image_file.read())
+        engine = OdtEngine({'NAME': 'odt', 'DIRS': [TEMPLATES_PATH], 'APP_DIRS': False, 'OPTIONS': {}})
+        content = engine.get_template_content(ODT_TEMPLATE_PATH).replace(
+            '{{ object.name }}', '{% for url in urls %}{% image_url_loader url %}{% endfor %}')
+        template = engine.from_string(content, template_path=ODT_TEMPLATE_PATH)
+
+        rendered = template.render({'urls': ['http://a.com/image.png', 'http://b.com/image.png']})
+
+        self.assertEqual(mocked_request.call_count, 2)
+        with ZipFile(BytesIO(rendered), 'r') as zip_file:
+            content_xml = zip_file.read('content.xml').decode()
+            self.assertNotIn('[[image-', content_xml)
+            self.assertEqual(content_xml.count('<draw:frame'), 2)
+            self.assertEqual(len([name for name in zip_file.namelist() if name.startswith('Pictures/')]), 1)
+
+
+class PictureRequestHandler(BaseHTTPRequestHandler):
+    paths = []
+
+    def do_GET(self):
+        self.paths.append(self.path)
+        with open(IMAGE_PATH, 'rb') as image_file:
+            content = image_file.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class AsyncRenderTestCase(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), PictureRequestHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = 'http://127.0.0.1:{}'.format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        PictureRequestHandler.paths = []
+
+    def run_async(self, coroutine):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    def test_odt_arender(self):
+        engine = OdtEngine({'NAME': 'odt', 'DIRS': [TEMPLATES_PATH], 'APP_DIRS': False, 'OPTIONS': {}})
+        content = engine.get_template_content(ODT_TEMPLATE_PATH).replace(
+            '{{ object.name }}', '{% for url in urls %}{% image_url_loader url %}{% endfor %}')
+        template = engine.from_string(content, template_path=ODT_TEMPLATE_PATH)
+
+        urls = [f'{self.url}/a.png', f'{self.url}/b.png']
+        rendered = self.run_async(template.arender({'urls': urls}))
+
+        self.assertEqual(sorted(PictureRequestHandler.paths), ['/a.png', '/b.png'])
+        with ZipFile(BytesIO(rendered), 'r') as zip_file:
+            content_xml = zip_file.read('content.xml').decode()
+            self.assertNotIn('[[image-', content_xml)
+            self.assertEqual(content_xml.count('<draw:frame'), 2)
+            self.assertEqual(len([name for name in zip_file.namelist() if name.startswith('Pictures/')]), 1)
+        with ZipFile(BytesIO(template.render({'urls': urls})), 'r') as zip_file:
+            self.assertEqual(zip_file.read('content.xml').decode(), content_xml)
+
+    def test_docx_arender(self):
+        engine = DocxEngine({'NAME': 'docx', 'DIRS': [], 'APP_DIRS': False, 'OPTIONS': {}})
+        template = engine.get_template(DOCX_TEMPLATE_PATH)
+        context = {'object': {'name': 'Michel'}}
+
+        rendered = self.run_async(template.arender(context))
+
+        with ZipFile(BytesIO(rendered), 'r') as zip_file, ZipFile(BytesIO(template.render(context)), 'r') as expected:
+            self.assertEqual(zip_file.namelist(), expected.namelist())
+            self.assertEqual(zip_file.read('word/document.xml'), expected.read('word/document.xml'))
+
+    def test_weasyprint_arender(self):
+        from template_engines.backends.weasyprint import WeasyprintEngine, WeasyprintTemplate
+
+        engine = WeasyprintEngine({'NAME': 'pdf', 'DIRS': [], 'APP_DIRS': False, 'OPTIONS': {}})
+        template = WeasyprintTemplate(engine.engine.from_string(
+            '<html><body>{% for url in urls %}<img src="{% image_url_loader url %}">{% endfor %}</body></html>'),
+            backend=engine)
+        urls = [f'{self.url}/a.png', f'{self.url}/b.png']
+
+        rendered = self.run_async(template.arender({'urls': urls}))
+
+        self.assertEqual(rendered[:4], b'%PDF')
+        self.assertEqual(sorted(PictureRequestHandler.paths), ['/a.png', '/b.png'])
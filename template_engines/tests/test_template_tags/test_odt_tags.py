@@ -1,7 +1,9 @@
 import base64
+import hashlib
 import io
 from unittest import mock
 
+from PIL import Image
 from bs4 import BeautifulSoup
 from django.template import Context, Template
 from django.template.exceptions import TemplateSyntaxError
@@ -10,6 +12,11 @@ from requests.exceptions import ConnectionError
 
 from template_engines.templatetags import odt_tags
 from template_engines.tests.settings import IMAGE_PATH
+from template_engines.tests.utils import get_response
+from template_engines.utils.fetch import ImageFetcher
+
+with open(IMAGE_PATH, 'rb') as image_file:
+    IMAGE_HASH = hashlib.sha256(image_file.read()).hexdigest()
 
 
 class FilterFromHTMLTestCase(TestCase):
@@ -69,6 +76,53 @@ class FilterFromHTMLTestCase(TestCase):
         odt_tags.parse_underline(soup)
         self.assertEqual('<text:span text:style-name="UNDERLINE">Underline</text:span>', str(soup))
 
+    @mock.patch('requests.Session.request')
+    def test_img(self, mocked_request):
+        with open(IMAGE_PATH, 'rb') as image_file:
+            mocked_request.return_value = get_response(image_file.read())
+        soup = BeautifulSoup('<p><img src="https://test.com/image.png"></p>', "html.parser")
+        odt_tags.parse_img(soup)
+        self.assertEqual('<p><draw:frame draw:style-name="fr1" draw:z-index="37" svg:height="136px" '
+                         'svg:width="394px" text:anchor-type="as-char">'
+                         '<draw:image draw:mime-type="image/png" xlink:actuate="onload" '
+                         'xlink:href="https://test.com/image.png" xlink:show="embed" xlink:type="simple">'
+                         '</draw:image></draw:frame></p>', str(soup))
+
+    @mock.patch('requests.Session.request')
+    def test_img_not_accessible(self, mocked_request):
+        mocked_request.return_value = get_response(status_code=404)
+        soup = BeautifulSoup('<p><img src="https://test.com/image.png"></p>', "html.parser")
+        odt_tags.parse_img(soup)
+        self.assertEqual('<p></p>', str(soup))
+
+    @mock.patch('requests.Session.request')
+    def test_img_not_a_picture(self, mocked_request):
+        mocked_request.return_value = get_response(b'<html></html>')
+        soup = BeautifulSoup('<p><img src="https://test.com/image.png"></p>', "html.parser")
+        with self.assertLogs('template_engines.templatetags.odt_tags', 'ERROR'):
+            odt_tags.parse_img(soup)
+        self.assertEqual('<p></p>', str(soup))
+
+    @mock.patch('requests.Session.request')
+    def test_img_fetched_not_accessible(self, mocked_request):
+        mocked_request.return_value = get_response(status_code=404)
+        with ImageFetcher() as fetcher:
+            soup = BeautifulSoup('<p><img src="https://test.com/image.png"></p>', "html.parser")
+            odt_tags.parse_img(soup)
+            fetcher.fetch()
+            self.assertEqual('<p></p>', fetcher.resolve(str(soup)))
+
+    @mock.patch('requests.Session.request')
+    def test_img_fetched_not_a_picture(self, mocked_request):
+        mocked_request.return_value = get_response(b'<html></html>')
+        with ImageFetcher() as fetcher:
+            soup = BeautifulSoup('<p><img src="https://test.com/image.png"></p>', "html.parser")
+            odt_tags.parse_img(soup)
+            with self.assertLogs('template_engines.templatetags.odt_tags', 'ERROR'):
+                fetcher.fetch()
+                rendered = fetcher.resolve(str(soup))
+            self.assertEqual('<p></p>', rendered)
+
     def test_h(self):
         soup = BeautifulSoup('<h1>Title 1</h1><h2>Title 2</h2><h3>Title 3</h3>', "html.parser")
         odt_tags.parse_h(soup)
@@ -82,16 +136,15 @@ class FilterFromHTMLTestCase(TestCase):
         self.assertEqual('<text:p><text:line-break/></text:p>', str(soup))
 
 
-@mock.patch('secrets.token_hex', return_value='test')
 class ImageLoaderTestCase(TestCase):
-    def test_image_loader_object(self, token):
+    def test_image_loader_object(self):
         with open(IMAGE_PATH, 'rb') as image_file:
             context = Context({'image': image_file.read()})
         template_to_render = Template('{% load odt_tags %}{% image_loader image %}{% image_loader image %}')
         rendered_template = template_to_render.render(context)
-        self.assertEqual(rendered_template.count('<draw:frame draw:name="{name}.png"'.format(name=token.return_value)), 2)
+        self.assertEqual(rendered_template.count('<draw:frame draw:name="{name}.png"'.format(name=IMAGE_HASH)), 2)
 
-    def test_image_loader_resize(self, token):
+    def test_image_loader_resize(self):
         with open(IMAGE_PATH, 'rb') as image_file:
             context = Context({'image': image_file.read()})
         template_to_render = Template('{% load odt_tags %}{% image_loader image max_width="100" max_height="100" %}')
@@ -99,7 +152,7 @@ class ImageLoaderTestCase(TestCase):
         self.assertNotIn('svg:width="16697.0" svg:height="5763.431472081218"', rendered_template)
         self.assertIn('svg:width="0.1cm" svg:height="0.03cm"', rendered_template)
 
-    def test_image_url_loader_resize_one_argument(self, token):
+    def test_image_url_loader_resize_one_argument(self):
         with open(IMAGE_PATH, 'rb') as image_file:
             context = Context({'image': image_file.read()})
         template_to_render = Template('{% load odt_tags %}{% image_loader image max_height="100" %}')
@@ -107,21 +160,62 @@ class ImageLoaderTestCase(TestCase):
         self.assertNotIn('svg:width="16697.0" svg:height="5763.431472081218"', rendered_template)
         self.assertIn('svg:width="0.29cm" svg:height="0.1cm"', rendered_template)
 
-    def test_image_loader_fail(self, token):
+    def test_image_loader_dpi(self):
+        with open(IMAGE_PATH, 'rb') as image_file:
+            context = Context({'image': image_file.read()})
+        template_to_render = Template('{% load odt_tags %}{% image_loader image max_width="1cm" dpi=72 %}')
+        rendered_template = template_to_render.render(context)
+        self.assertIn('svg:width="0.57cm" svg:height="0.2cm"', rendered_template)
+        picture, = context['images'].values()
+        with Image.open(io.BytesIO(picture)) as image:
+            # 0.57cm at 72 dpi
+            self.assertEqual(image.size, (17, 6))
+
+    def test_image_loader_dpi_truncated(self):
+        with open(IMAGE_PATH, 'rb') as image_file:
+            picture = image_file.read()[:-500]
+        context = Context({'image': picture})
+        template_to_render = Template('{% load odt_tags %}{% image_loader image max_width="1cm" dpi=72 quality=80 %}')
+        with self.assertLogs('template_engines.utils.images', 'ERROR'):
+            rendered_template = template_to_render.render(context)
+        self.assertIn('svg:width="0.57cm" svg:height="0.2cm"', rendered_template)
+        # embedded as is
+        self.assertEqual(list(context['images'].values()), [picture])
+
+    def test_image_loader_engine_options(self):
+        with open(IMAGE_PATH, 'rb') as image_file:
+            context = Context({'image': image_file.read()})
+        template_to_render = Template('{% load odt_tags %}{% image_loader image %}')
+        with ImageFetcher(image_options={'dpi': None, 'quality': 80, 'format': 'jpeg'}):
+            rendered_template = template_to_render.render(context)
+        name, = context['images'].keys()
+        self.assertTrue(name.endswith('.jpeg'))
+        self.assertIn('draw:mime-type="image/jpeg"', rendered_template)
+
+    def test_image_loader_probed_once(self):
+        with open(IMAGE_PATH, 'rb') as image_file:
+            context = Context({'image': image_file.read() + b'probe'})
+        template_to_render = Template('{% load odt_tags %}{% image_loader image max_width="1cm" %}'
+                                      '{% image_loader image %}')
+        with mock.patch('template_engines.utils.images.Image.open', wraps=Image.open) as mocked_open:
+            template_to_render.render(context)
+        self.assertEqual(mocked_open.call_count, 1)
+
+    def test_image_loader_fail(self):
         with self.assertRaises(TemplateSyntaxError) as cm:
             Template('{% load odt_tags %}{% image_loader image=image %}')
         self.assertEqual('Usage: {% image_loader [image] max_width="5000px" max_height="5000px" '
                          'anchor="as-char" %}', str(cm.exception))
 
-    def test_image_loader_object_base64(self, token):
+    def test_image_loader_object_base64(self):
         with open(IMAGE_PATH, 'rb') as image_file:
             context = Context({'image': ';base64,%s' % base64.b64encode(image_file.read()).decode()})
 
         template_to_render = Template('{% load odt_tags %}{% image_loader image %}')
         rendered_template = template_to_render.render(context)
-        self.assertIn('<draw:frame draw:name="{name}.png"'.format(name=token.return_value), rendered_template)
+        self.assertIn('<draw:frame draw:name="{name}.png"'.format(name=IMAGE_HASH), rendered_template)
 
-    def test_image_loader_anchor(self, token):
+    def test_image_loader_anchor(self):
         with open(IMAGE_PATH, 'rb') as image_file:
             context = Context({'image': ';base64,%s' % base64.b64encode(image_file.read()).decode()})
         template_to_render = Template('{% load odt_tags %}{% image_loader image anchor="as-char" %}')
@@ -130,13 +224,25 @@ class ImageLoaderTestCase(TestCase):
         self.assertNotIn('text:anchor-type="paragraph"', rendered_template)
 
 
-@mock.patch('secrets.token_hex', return_value='test')
 class ImageUrlLoaderTestCase(TestCase):
-    @mock.patch('requests.get')
-    def test_image_url_loader_object(self, mocked_get, token):
-        mocked_get.return_value.status_code = 200
+    @mock.patch('requests.Session.request')
+    def test_image_url_loader_hashed_once(self, mocked_request):
+        with open(IMAGE_PATH, 'rb') as image_file:
+            picture = image_file.read() + b'hashed'
+        mocked_request.return_value = get_response(picture)
+        context = Context({'url': "https://test.com"})
+        template_to_render = Template('{% load odt_tags %}{% image_url_loader url max_width="1cm" %}'
+                                      '{% image_url_loader url %}')
+        with mock.patch('hashlib.sha256', wraps=hashlib.sha256) as mocked_sha256, ImageFetcher() as fetcher:
+            fetcher.resolve(template_to_render.render(context))
+        # probed, named and embedded with the digest of the fetched picture
+        self.assertEqual([args for args, kwargs in mocked_sha256.call_args_list].count((picture,)), 1)
+        self.assertEqual(len(context['images']), 1)
+
+    @mock.patch('requests.Session.request')
+    def test_image_url_loader_object(self, mocked_request):
         with open(IMAGE_PATH, 'rb') as image_file:
-            mocked_get.return_value.content = image_file.read()
+            mocked_request.return_value = get_response(image_file.read())
         context = Context({'url': "https://test.com"})
         template_to_render = Template('{% load odt_tags %}{% image_url_loader url %}')
 
@@ -147,15 +253,14 @@ class ImageUrlLoaderTestCase(TestCase):
             '<draw:image xlink:href="Pictures/{name}.png" xlink:type="simple" xlink:show="embed" xlink:actuate="onLoad"'
             ' draw:mime-type="image/png" />'
             '</draw:frame>'
-        ).format(name=token.return_value)
+        ).format(name=IMAGE_HASH)
 
         self.assertEqual(data, rendered_template)
 
-    @mock.patch('requests.get')
-    def test_image_url_loader_url(self, mocked_get, token):
-        mocked_get.return_value.status_code = 200
+    @mock.patch('requests.Session.request')
+    def test_image_url_loader_url(self, mocked_request):
         with open(IMAGE_PATH, 'rb') as image_file:
-            mocked_get.return_value.content = image_file.read()
+            mocked_request.return_value = get_response(image_file.read())
         context = Context({})
         template_to_render = Template('{% load odt_tags %}{% image_url_loader "https://test.com" %}')
 
@@ -166,78 +271,72 @@ class ImageUrlLoaderTestCase(TestCase):
             '<draw:image xlink:href="Pictures/{name}.png" xlink:type="simple" xlink:show="embed" xlink:actuate="onLoad"'
             ' draw:mime-type="image/png" />'
             '</draw:frame>'
-        ).format(name=token.return_value)
+        ).format(name=IMAGE_HASH)
         self.assertEqual(data, rendered_template)
 
-    @mock.patch('requests.get')
-    def test_image_url_loader_resize(self, mocked_get, token):
-        mocked_get.return_value.status_code = 200
+    @mock.patch('requests.Session.request')
+    def test_image_url_loader_resize(self, mocked_request):
         with open(IMAGE_PATH, 'rb') as image_file:
-            mocked_get.return_value.content = image_file.read()
+            mocked_request.return_value = get_response(image_file.read())
         context = Context({'url': "https://test.com"})
         template_to_render = Template('{% load odt_tags %}{% image_url_loader url max_width="100" max_height="100" %}')
         rendered_template = template_to_render.render(context)
         self.assertNotIn('svg:width="5910.0" svg:height="2040.0"', rendered_template)
         self.assertIn('svg:width="0.1cm" svg:height="0.03cm"', rendered_template)
 
-    @mock.patch('requests.get')
-    def test_image_url_loader_resize_one_argument(self, mocked_get, token):
-        mocked_get.return_value.status_code = 200
+    @mock.patch('requests.Session.request')
+    def test_image_url_loader_resize_one_argument(self, mocked_request):
         with open(IMAGE_PATH, 'rb') as image_file:
-            mocked_get.return_value.content = image_file.read()
+            mocked_request.return_value = get_response(image_file.read())
         context = Context({'url': "https://test.com"})
         template_to_render = Template('{% load odt_tags %}{% image_url_loader url max_height="100" %}')
         rendered_template = template_to_render.render(context)
         self.assertNotIn('svg:width="5910.0" svg:height="2040.0"', rendered_template)
         self.assertIn('svg:width="0.29cm" svg:height="0.1cm"', rendered_template)
 
-    @mock.patch('requests.get')
-    def test_image_url_loader_fail(self, mocked_get, token):
-        mocked_get.return_value.status_code = 200
+    @mock.patch('requests.Session.request')
+    def test_image_url_loader_fail(self, mocked_request):
         with open(IMAGE_PATH, 'rb') as image_file:
-            mocked_get.return_value.content = image_file.read()
+            mocked_request.return_value = get_response(image_file.read())
         with self.assertRaises(TemplateSyntaxError) as cm:
             Template('{% load odt_tags %}{% image_url_loader url="https://test.com" %}')
         self.assertEqual('Usage: {% image_url_loader [url] max_width="5000px" '
                          'max_height="5000px" request="GET" data="{"data": "example"}" '
                          'anchor="as-char" %}', str(cm.exception))
 
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.request')
     @mock.patch('sys.stderr', new_callable=io.StringIO)
-    def test_image_url_loader_picture_not_accessible(self, mock_out, mocked_get, token):
-        mocked_get.return_value.status_code = 404
-        mocked_get.return_value.content = b''
+    def test_image_url_loader_picture_not_accessible(self, mock_out, mocked_request):
+        mocked_request.return_value = get_response(status_code=404)
         context = Context({})
         template_to_render = Template('{% load odt_tags %}{% image_url_loader "https://test.com" %}')
         template_to_render.render(context)
         self.assertEqual(mock_out.getvalue(), 'The picture with url : https://test.com is not accessible (Error: 404)\n')
 
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.request')
     @mock.patch('sys.stderr', new_callable=io.StringIO)
-    def test_image_url_loader_picture_connection_error(self, mock_out, mocked_get, token):
-        mocked_get.side_effect = ConnectionError
+    def test_image_url_loader_picture_connection_error(self, mock_out, mocked_request):
+        mocked_request.side_effect = ConnectionError
         context = Context({})
         template_to_render = Template('{% load odt_tags %}{% image_url_loader "https://test.com" %}')
         template_to_render.render(context)
         self.assertEqual(mock_out.getvalue(), 'Connection Error, check the url given (https://test.com)\n')
 
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.request')
     @mock.patch('sys.stderr', new_callable=io.StringIO)
-    def test_image_url_loader_picture_wrong_request(self, mock_out, mocked_get, token):
-        mocked_get.return_value.status_code = 200
+    def test_image_url_loader_picture_wrong_request(self, mock_out, mocked_request):
         with open(IMAGE_PATH, 'rb') as image_file:
-            mocked_get.return_value.content = image_file.read()
+            mocked_request.return_value = get_response(image_file.read())
         context = Context({})
         template_to_render = Template('{% load odt_tags %}{% image_url_loader "https://test.com" request="WRONG" %}')
         template_to_render.render(context)
         self.assertEqual(mock_out.getvalue(), 'Type of request specified not allowed\n')
 
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.request')
     @mock.patch('sys.stderr', new_callable=io.StringIO)
-    def test_image_url_loader_picture_with_datas(self, mock_out, mocked_get, token):
-        mocked_get.return_value.status_code = 200
+    def test_image_url_loader_picture_with_datas(self, mock_out, mocked_request):
         with open(IMAGE_PATH, 'rb') as image_file:
-            mocked_get.return_value.content = image_file.read()
+            mocked_request.return_value = get_response(image_file.read())
         context = Context({'data': {'data_to_send': 'bob'}})
         template_to_render = Template('{% load odt_tags %}{% image_url_loader "https://test.com" data=data %}')
         rendered_template = template_to_render.render(context)
@@ -247,14 +346,13 @@ class ImageUrlLoaderTestCase(TestCase):
             '<draw:image xlink:href="Pictures/{name}.png" xlink:type="simple" xlink:show="embed" '
             'xlink:actuate="onLoad" draw:mime-type="image/png" />'
             '</draw:frame>'
-        ).format(name=token.return_value)
+        ).format(name=IMAGE_HASH)
         self.assertEqual(data, rendered_template)
 
-    @mock.patch('requests.post')
-    def test_image_url_loader_picture_post_request(self, mocked_post, token):
-        mocked_post.return_value.status_code = 200
+    @mock.patch('requests.Session.request')
+    def test_image_url_loader_picture_post_request(self, mocked_request):
         with open(IMAGE_PATH, 'rb') as image_file:
-            mocked_post.return_value.content = image_file.read()
+            mocked_request.return_value = get_response(image_file.read())
         context = Context({})
         template_to_render = Template('{% load odt_tags %}{% image_url_loader "https://test.com" request="POST" %}')
         rendered_template = template_to_render.render(context)
@@ -264,15 +362,14 @@ class ImageUrlLoaderTestCase(TestCase):
             '<draw:image xlink:href="Pictures/{name}.png" xlink:type="simple" xlink:show="embed" '
             'xlink:actuate="onLoad" draw:mime-type="image/png" />'
             '</draw:frame>'
-        ).format(name=token.return_value)
+        ).format(name=IMAGE_HASH)
         self.assertEqual(data, rendered_template)
 
-    @mock.patch('requests.get')
-    def test_image_loader_anchor(self, mocked_get, token):
-        mocked_get.return_value.status_code = 200
+    @mock.patch('requests.Session.request')
+    def test_image_loader_anchor(self, mocked_request):
         with open(IMAGE_PATH, 'rb') as image_file:
             content = image_file.read()
-            mocked_get.return_value.content = content
+            mocked_request.return_value = get_response(content)
             context = Context({'image': ';base64,%s' % base64.b64encode(content).decode()})
         template_to_render = Template('{% load odt_tags %}{% image_url_loader "https://test.com" data=data '
                                       'anchor="as-char" %}')
@@ -1,7 +1,10 @@
+from unittest import mock
+
 from django.test import TestCase
 
-from template_engines.templatetags.utils import size_parser, resize
+from template_engines.templatetags.utils import get_image_infos_from_uri, size_parser, resize
 from template_engines.tests.settings import IMAGE_PATH
+from template_engines.tests.utils import get_response
 
 
 class TestUtils(TestCase):
@@ -61,3 +64,24 @@ class TestUtils(TestCase):
         width, height = resize(img, None, None)
         self.assertEqual(width, 5910.0)
         self.assertEqual(height, 2040.0)
+
+    @mock.patch('requests.Session.request')
+    def test_get_image_infos_from_uri(self, mocked_request):
+        with open(IMAGE_PATH, 'rb') as image_file:
+            content = image_file.read()
+        mocked_request.return_value = get_response(content)
+        self.assertEqual(get_image_infos_from_uri('https://test.com/image.png'),
+                         (len(content), (394, 136), 'image/png'))
+
+    @mock.patch('requests.Session.request')
+    def test_get_image_infos_from_uri_not_a_picture(self, mocked_request):
+        mocked_request.return_value = get_response(b'<html></html>')
+        self.assertEqual(get_image_infos_from_uri('https://test.com/image.png'), (13, (None, None), None))
+
+    @mock.patch('requests.Session.request')
+    def test_get_image_infos_from_uri_not_accessible(self, mocked_request):
+        mocked_request.return_value = get_response(status_code=404)
+        self.assertEqual(get_image_infos_from_uri('https://test.com/image.png'), (None, (None, None), None))
+
+    def test_get_image_infos_from_uri_file(self):
+        self.assertEqual(get_image_infos_from_uri(f'file://{IMAGE_PATH}'), (None, (None, None), None))
@@ -1,13 +1,32 @@
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-from zipfile import ZipFile
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+from zipfile import ZIP_DEFLATED, ZipFile
 
+from PIL import Image, ImageCms
 from bs4 import BeautifulSoup
+from django.core.cache import caches
 from django.test import TestCase
+from requests.exceptions import ReadTimeout
+
+from template_engines.backends.odt import OdtEngine
 
 from template_engines.tests.settings import (ODT_TEMPLATE_PATH, DOCX_TEMPLATE_PATH, IMAGE_PATH, BAD_TAGS_XML,
                                              CLEAN_CONTENT)
-from template_engines.utils import modify_content_document, clean_tags
-from template_engines.utils.docx import add_image_in_docx_template
+from template_engines.tests.utils import get_response
+from template_engines.utils import clean_tags, get_content_url, modify_content_document
+from template_engines.utils.archive import RawZipFile
+from template_engines.utils.assets import AssetCache, get_asset_cache
+from template_engines.utils.cache import LRUCache, TTLCache
+from template_engines.utils.docx import add_image_in_docx_template, add_images_in_docx_template
+from template_engines.utils.http import HttpClient
+from template_engines.utils import images
+from template_engines.utils.images import ImageInfo, get_image_cache, optimize_image, probe_image
+from template_engines.utils.odt import add_images_in_odt_template
 
 
 class TestUtils(TestCase):
@@ -54,6 +73,41 @@ class TestUtils(TestCase):
                     else:
                         self.assertEqual(buffer_zip_obj.read(filename), b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n')
 
+    def test_modify_content_document_copies_raw_members(self):
+        new_file = modify_content_document(ODT_TEMPLATE_PATH, ['content.xml'],
+                                           BeautifulSoup('<content-merged></content-merged>', 'html.parser'))
+        with ZipFile(BytesIO(new_file), 'r') as buffer_zip_obj:
+            self.assertIsNone(buffer_zip_obj.testzip())
+            with ZipFile(ODT_TEMPLATE_PATH, 'r') as odt_zip_obj:
+                for item in odt_zip_obj.infolist():
+                    if item.filename != 'content.xml':
+                        new_item = buffer_zip_obj.getinfo(item.filename)
+                        self.assertEqual(new_item.compress_type, item.compress_type)
+                        self.assertEqual(new_item.compress_size, item.compress_size)
+                        self.assertEqual(new_item.CRC, item.CRC)
+
+    def test_raw_zip_file_copy_member(self):
+        source = BytesIO()
+        with ZipFile(source, 'w', compression=ZIP_DEFLATED) as source_zip:
+            source_zip.writestr('a.txt', b'a' * 1000)
+            with source_zip.open('b.txt', 'w') as member:
+                # written with a data descriptor
+                member.write(b'b' * 1000)
+
+        output = BytesIO()
+        with ZipFile(source, 'r') as source_zip:
+            with RawZipFile(output, 'w') as output_zip:
+                for item in source_zip.infolist():
+                    output_zip.copy_member(source_zip, item)
+                output_zip.writestr('c.txt', b'c')
+
+        with ZipFile(output, 'r') as output_zip:
+            self.assertIsNone(output_zip.testzip())
+            self.assertEqual(output_zip.read('a.txt'), b'a' * 1000)
+            self.assertEqual(output_zip.read('b.txt'), b'b' * 1000)
+            self.assertEqual(output_zip.read('c.txt'), b'c')
+            self.assertEqual(output_zip.getinfo('b.txt').compress_type, ZIP_DEFLATED)
+
     def test_add_image_in_docx_template_works(self):
         with open(IMAGE_PATH, 'rb') as image_file:
             img_content = image_file.read()
@@ -87,6 +141,41 @@ class TestUtils(TestCase):
                 ])
             )
 
+    def test_add_images_in_docx_template_works(self):
+        with open(IMAGE_PATH, 'rb') as image_file:
+            img_content = image_file.read()
+
+        with open(DOCX_TEMPLATE_PATH, 'rb') as template_file:
+            new_file = add_images_in_docx_template(template_file.read(), [
+                {'name': 'first.png', 'content': img_content},
+                {'name': 'second.png', 'content': img_content},
+            ])
+        with ZipFile(BytesIO(new_file), 'r') as buffer_zip_obj:
+            self.assertEqual(buffer_zip_obj.read('word/media/first.png'), img_content)
+            self.assertEqual(buffer_zip_obj.read('word/media/second.png'), img_content)
+            relationships = buffer_zip_obj.read('word/_rels/document.xml.rels').decode()
+            self.assertIn('<Relationship Id="first.png" ', relationships)
+            self.assertIn('<Relationship Id="second.png" ', relationships)
+            self.assertTrue(relationships.endswith('Target="media/second.png"/></Relationships>'))
+
+    def test_add_images_in_odt_template_works(self):
+        with open(IMAGE_PATH, 'rb') as image_file:
+            img_content = image_file.read()
+
+        with open(ODT_TEMPLATE_PATH, 'rb') as template_file:
+            template_content = template_file.read()
+        new_file = add_images_in_odt_template(template_content, {'first.png': img_content,
+                                                                 'second.png': img_content})
+        with ZipFile(BytesIO(new_file), 'r') as buffer_zip_obj:
+            self.assertEqual(buffer_zip_obj.read('Pictures/first.png'), img_content)
+            self.assertEqual(buffer_zip_obj.read('Pictures/second.png'), img_content)
+            manifest = buffer_zip_obj.read('META-INF/manifest.xml').decode()
+            self.assertIn('manifest:full-path="Pictures/first.png"', manifest)
+            self.assertIn('manifest:full-path="Pictures/second.png"', manifest)
+            with ZipFile(BytesIO(template_content), 'r') as odt_zip_obj:
+                self.assertEqual(buffer_zip_obj.namelist(),
+                                 odt_zip_obj.namelist() + ['Pictures/first.png', 'Pictures/second.png'])
+
     def test_remove_bad_tags(self):
         with open(BAD_TAGS_XML) as reader:
             content = reader.read()
@@ -94,3 +183,300 @@ class TestUtils(TestCase):
         self.assertNotEqual(content, clean_content)
         with open(CLEAN_CONTENT) as reader:
             self.assertEqual(reader.read(), clean_content)
+
+
+class TestLRUCache(TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(10)
+        cache.set('a', 'A', 4)
+        cache.set('b', 'B', 4)
+        self.assertEqual(cache.get('a'), 'A')
+        cache.set('c', 'C', 4)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.get('a'), 'A')
+        self.assertEqual(cache.get('c'), 'C')
+        self.assertEqual(cache.size, 8)
+
+    def test_too_big_entry(self):
+        cache = LRUCache(10)
+        cache.set('a', 'A', 11)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.size, 0)
+
+    def test_replace_and_delete(self):
+        cache = LRUCache(10)
+        cache.set('a', 'A', 4)
+        cache.set('a', 'AA', 6)
+        self.assertEqual(cache.get('a'), 'AA')
+        self.assertEqual(cache.size, 6)
+        cache.delete('a')
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+
+
+class TestTTLCache(TestCase):
+
+    @mock.patch('time.monotonic', return_value=100)
+    def test_expires(self, mocked_time):
+        cache = TTLCache(10)
+        cache.set('a', None)
+        self.assertIsNone(cache.get('a', 'missing'))
+        mocked_time.return_value = 110
+        self.assertEqual(cache.get('a', 'missing'), 'missing')
+        self.assertEqual(len(cache), 0)
+
+    def test_max_entries(self):
+        cache = TTLCache(10, max_entries=2)
+        cache.set('a', 'A')
+        cache.set('b', 'B')
+        self.assertEqual(cache.get('a'), 'A')
+        cache.set('c', 'C')
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 'A')
+        self.assertEqual(cache.get('c'), 'C')
+
+    def test_disabled(self):
+        cache = TTLCache(0)
+        cache.set('a', 'A')
+        self.assertIsNone(cache.get('a'))
+
+
+class TestHttpClient(TestCase):
+
+    @mock.patch('requests.Session.request')
+    def test_engine_options(self, mocked_request):
+        mocked_request.return_value = get_response(b'content')
+        options = {'http': {'connect_timeout': 1, 'read_timeout': 2, 'retries': 0}}
+        engine = OdtEngine({'NAME': 'odt', 'DIRS': [], 'APP_DIRS': False, 'OPTIONS': options})
+        self.assertIn('http', options)
+
+        response = get_content_url('https://test.com', 'get', {}, engine.http_client)
+        self.assertEqual(response.content, b'content')
+        mocked_request.assert_called_once_with('GET', 'https://test.com', data={}, headers={}, timeout=(1, 2), stream=True)
+        self.assertEqual(engine.http_client.session.get_adapter('https://test.com').max_retries.total, 0)
+
+    @mock.patch('requests.Session.request')
+    @mock.patch('sys.stderr', new_callable=io.StringIO)
+    def test_max_size(self, mock_out, mocked_request):
+        mocked_request.return_value = get_response(b'0123456789')
+        self.assertIsNone(get_content_url('https://test.com', 'get', {}, HttpClient(max_size=5)))
+        self.assertEqual(mock_out.getvalue(), 'The picture with url : https://test.com is larger than 5 bytes\n')
+        self.assertEqual(get_content_url('https://test.com', 'get', {}, HttpClient(max_size=10)).content,
+                         b'0123456789')
+
+    @mock.patch('requests.Session.request', side_effect=ReadTimeout('timed out'))
+    @mock.patch('sys.stderr', new_callable=io.StringIO)
+    def test_timeout(self, mock_out, mocked_request):
+        self.assertIsNone(get_content_url('https://test.com', 'get', {}))
+        self.assertEqual(mock_out.getvalue(), 'The picture with url : https://test.com is not accessible (timed out)\n')
+
+
+class TestHttpClientCookies(TestCase):
+
+    def setUp(self):
+        self.cookies = []
+        cookies = self.cookies
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                cookies.append(self.headers.get('Cookie'))
+                self.send_response(200)
+                self.send_header('Set-Cookie', 'session=secret; Path=/')
+                self.send_header('Content-Length', '7')
+                self.end_headers()
+                self.wfile.write(b'content')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_cookies_not_kept(self):
+        client = HttpClient(retries=0)
+        url = 'http://127.0.0.1:{}/image.png'.format(self.server.server_port)
+        self.assertEqual(get_content_url(url, 'get', {}, client).content, b'content')
+        self.assertEqual(get_content_url(url, 'get', {}, client).content, b'content')
+        self.assertEqual(self.cookies, [None, None])
+        self.assertEqual(len(client.session.cookies), 0)
+
+
+class TestAssetCache(TestCase):
+    url = 'https://assets.test/logo.png'
+
+    def tearDown(self):
+        get_asset_cache().clear()
+
+    @mock.patch('requests.Session.request')
+    def test_fresh_response_is_reused(self, mocked_request):
+        mocked_request.return_value = get_response(b'logo', headers={'Cache-Control': 'max-age=60',
+                                                                     'Content-Type': 'image/png'})
+        self.assertEqual(get_content_url(self.url, 'get', '').content, b'logo')
+        response = get_content_url(self.url, 'GET', '')
+        self.assertEqual(response.content, b'logo')
+        self.assertEqual(response.headers['content-type'], 'image/png')
+        self.assertEqual(mocked_request.call_count, 1)
+
+        # requests with data are not cached
+        get_content_url(self.url, 'post', {'data': 'bob'})
+        self.assertEqual(mocked_request.call_count, 2)
+
+    @mock.patch('requests.Session.request')
+    def test_response_not_stored(self, mocked_request):
+        mocked_request.return_value = get_response(b'logo', headers={'Cache-Control': 'no-store, max-age=60'})
+        get_content_url(self.url, 'get', '')
+        get_content_url(self.url, 'get', '')
+        self.assertEqual(mocked_request.call_count, 2)
+
+    def test_revalidate(self):
+        cache = AssetCache(1024)
+        fetch = mock.Mock(return_value=get_response(b'logo', headers={'ETag': '"v1"', 'Cache-Control': 'no-cache'}))
+        self.assertEqual(cache.get(self.url, fetch).content, b'logo')
+        fetch.assert_called_once_with({})
+
+        fetch.return_value = get_response(status_code=304, headers={'Cache-Control': 'max-age=60'})
+        self.assertEqual(cache.get(self.url, fetch).content, b'logo')
+        fetch.assert_called_with({'If-None-Match': '"v1"'})
+        # fresh after the revalidation
+        self.assertEqual(cache.get(self.url, fetch).content, b'logo')
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_expires(self):
+        cache = AssetCache(1024)
+        fetch = mock.Mock(return_value=get_response(b'logo', headers={
+            'Date': 'Mon, 17 Oct 2022 10:00:00 GMT', 'Expires': 'Mon, 17 Oct 2022 10:01:00 GMT'}))
+        with mock.patch('time.time', return_value=1000):
+            cache.get(self.url, fetch)
+        with mock.patch('time.time', return_value=1059):
+            cache.get(self.url, fetch)
+        self.assertEqual(fetch.call_count, 1)
+        with mock.patch('time.time', return_value=1061):
+            cache.get(self.url, fetch)
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_shared_cache(self):
+        fetch = mock.Mock(return_value=get_response(b'logo', headers={'Cache-Control': 'max-age=60'}))
+        AssetCache(0, 'default').get(self.url, fetch)
+        # another process
+        self.assertEqual(AssetCache(0, 'default').get(self.url, fetch).content, b'logo')
+        self.assertEqual(fetch.call_count, 1)
+        caches['default'].clear()
+
+    def test_concurrent_requests_are_collapsed(self):
+        cache = AssetCache(1024)
+        started = threading.Event()
+        release = threading.Event()
+
+        def fetch(headers):
+            started.set()
+            release.wait(5)
+            return get_response(b'logo')
+
+        fetch = mock.Mock(side_effect=fetch)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first = executor.submit(cache.get, self.url, fetch)
+            started.wait(5)
+            second = executor.submit(cache.get, self.url, fetch)
+            # waits for the second request to wait for the first one
+            while not cache._in_flight[cache.get_key(self.url)]._condition._waiters:
+                time.sleep(0.01)
+            release.set()
+            self.assertEqual(first.result().content, b'logo')
+            self.assertEqual(second.result().content, b'logo')
+        self.assertEqual(fetch.call_count, 1)
+
+
+def make_picture(size, image_format='JPEG', mode='RGB'):
+    image = Image.effect_noise(size, 64).convert(mode)
+    buffer = BytesIO()
+    image.save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class TestOptimizeImage(TestCase):
+    def setUp(self):
+        get_image_cache().clear()
+
+    def test_no_options(self):
+        picture = make_picture((40, 20))
+        self.assertIs(optimize_image(picture, 1, 0.5), picture)
+
+    def test_resample(self):
+        picture = make_picture((2000, 1000))
+        optimized = optimize_image(picture, 2, 1, dpi=100)
+        self.assertLess(len(optimized), len(picture))
+        with Image.open(BytesIO(optimized)) as image:
+            self.assertEqual(image.size, (200, 100))
+            self.assertEqual(image.format, 'JPEG')
+
+    def test_small_picture_kept(self):
+        picture = make_picture((100, 50))
+        self.assertIs(optimize_image(picture, 2, 1, dpi=100), picture)
+
+    def test_convert_format(self):
+        picture = make_picture((100, 50), 'PNG', 'RGBA')
+        optimized = optimize_image(picture, 2, 1, format='jpeg', quality=80)
+        with Image.open(BytesIO(optimized)) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (100, 50))
+
+    def test_orientation_and_profile_kept(self):
+        icc_profile = ImageCms.ImageCmsProfile(ImageCms.createProfile('sRGB')).tobytes()
+        exif = Image.Exif()
+        # rotated by 90 degrees, as taken by a phone
+        exif[0x0112] = 6
+        buffer = BytesIO()
+        Image.effect_noise((400, 300), 64).convert('RGB').save(buffer, 'JPEG', exif=exif, icc_profile=icc_profile)
+        picture = buffer.getvalue()
+        for options in ({'dpi': 100}, {'quality': 50}):
+            with Image.open(BytesIO(optimize_image(picture, 2, 1.5, **options))) as image:
+                self.assertEqual(image.getexif()[0x0112], 6)
+                self.assertEqual(image.info['icc_profile'], icc_profile)
+
+    def test_truncated_picture_kept(self):
+        picture = make_picture((2000, 1000))[:5000]
+        with self.assertLogs('template_engines.utils.images', 'ERROR'):
+            self.assertIs(optimize_image(picture, 2, 1, dpi=100, quality=80), picture)
+
+    def test_mode_not_saved_kept(self):
+        picture = make_picture((100, 50), 'TIFF', 'CMYK')
+        with self.assertLogs('template_engines.utils.images', 'ERROR'):
+            self.assertIs(optimize_image(picture, 2, 1, format='png'), picture)
+
+    def test_unknown_format_kept(self):
+        picture = make_picture((100, 50))
+        with self.assertLogs('template_engines.utils.images', 'ERROR'):
+            self.assertIs(optimize_image(picture, 2, 1, format='unknown'), picture)
+
+    def test_cached(self):
+        picture = make_picture((2000, 1000))
+        with mock.patch('template_engines.utils.images.encode_image', return_value=b'small') as encode_image:
+            self.assertEqual(optimize_image(picture, 2, 1, dpi=100), b'small')
+            self.assertEqual(optimize_image(picture, 2, 1, dpi=100), b'small')
+            self.assertEqual(encode_image.call_count, 1)
+            # another target size
+            optimize_image(picture, 1, 0.5, dpi=100)
+            self.assertEqual(encode_image.call_count, 2)
+
+
+class TestProbeImage(TestCase):
+    def setUp(self):
+        images._image_info_cache.clear()
+        with open(IMAGE_PATH, 'rb') as image_file:
+            self.picture = image_file.read()
+
+    def test_probe_image(self):
+        self.assertEqual(probe_image(self.picture), ImageInfo('png', 394, 136, 'image/png'))
+
+    def test_probe_image_memoized(self):
+        with mock.patch('template_engines.utils.images.Image.open', wraps=Image.open) as mocked_open:
+            probe_image(self.picture)
+            self.assertEqual(probe_image(bytes(self.picture)).width, 394)
+            probe_image(make_picture((10, 10)))
+        self.assertEqual(mocked_open.call_count, 2)
@@ -0,0 +1,13 @@
+import requests
+
+
+def get_response(content=b'', status_code=200, headers=None):
+    """
+    Returns a response as sent by a server, to mock ``requests.Session.request``.
+    """
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response._content = content
+    response._content_consumed = True
+    return response
@@ -3,13 +3,14 @@ import logging
 import os
 import re
 import requests
-from PIL import Image
-from tempfile import NamedTemporaryFile
-from zipfile import ZipFile
 
-from bs4 import BeautifulSoup
 from django.core.files.storage import default_storage
 
+from template_engines.utils.archive import RawZipFile, TemplateArchive
+from template_engines.utils.assets import get_asset_cache
+from template_engines.utils.http import HTTP_METHODS, ResponseTooLarge, get_default_client
+from template_engines.utils.images import get_picture_digest, probe_image
+
 logger = logging.getLogger(__name__)
 
 
@@ -22,7 +23,31 @@ def get_rendered_by_xml(xml_paths, soup):
     return dict_xml
 
 
-def modify_content_document(file_path, xml_paths, soup):
+def merge_rendered(xml_paths, rendered):
+    """
+    Merges the rendered content of each of ``xml_paths`` in a single string, the reverse of
+    ``get_rendered_by_xml``.
+    """
+    merged = ''.join(
+        '<{0}-merged>{1}</{0}-merged>'.format(os.path.splitext(xml_path)[0].replace('/', '-'), rendered[xml_path])
+        for xml_path in xml_paths
+    )
+    return '<global-merged>{}</global-merged>'.format(merged)
+
+
+def split_merged(xml_paths, content):
+    """
+    Returns the content of each of ``xml_paths`` merged in ``content``, see ``merge_rendered``.
+    """
+    dict_xml = {}
+    for xml_path in xml_paths:
+        tag_name = re.escape('{}-merged'.format(os.path.splitext(xml_path)[0].replace('/', '-')))
+        match = re.search(r'<{0}>(.*)</{0}>'.format(tag_name), content, re.S)
+        dict_xml[xml_path] = match.group(1) if match else ''
+    return dict_xml
+
+
+def modify_content_document(file_path, xml_paths, soup, archive=None, members=None):
     """
     Modify a libreoffice document (docx and odt only for the moment).
 
@@ -35,28 +60,42 @@ def modify_content_document(file_path, xml_paths, soup):
     :param rendered: content to put in the xml representation of the document.
     :type rendered: str
 
+    :param archive: Optional, the skeleton of the zip file already loaded in memory. The zip file is
+                    read from the storage otherwise.
+    :type archive: template_engines.utils.archive.TemplateArchive
+
+    :param members: Optional, content of other members to replace or to add, like images.
+    :type members: Dict[str, bytes]
+
     :returns: the modified file as a byte object.
     """
 
-    temp_file = NamedTemporaryFile()
     dict_xml_render = get_rendered_by_xml(xml_paths, soup)
-    with default_storage.open(file_path, 'rb') as template_file:
-        template_buffer = io.BytesIO(template_file.read())
+    if archive is None:
+        with default_storage.open(file_path, 'rb') as template_file:
+            archive = TemplateArchive(io.BytesIO(template_file.read()), xml_paths)
+    return write_archive(archive, dict_xml_render, members)
+
 
-    with ZipFile(template_buffer, 'r') as read_zip_file:
-        info_list = read_zip_file.infolist()
+def write_archive(archive, rendered, members=None):
+    """
+    Builds a zip document in memory from the skeleton of its template.
+
+    :param archive: the skeleton of the template.
+    :type archive: template_engines.utils.archive.TemplateArchive
+
+    :param rendered: the rendered content of each member listed in ``archive.rendered_files``.
+    :type rendered: Dict[str, str]
 
-        with ZipFile(temp_file.name, 'w') as write_zip_file:
-            for item in info_list:
-                if item.filename in xml_paths:
-                    version = BeautifulSoup(read_zip_file.read(item.filename).decode(), 'html.parser')
-                    version.findChild().decompose()
-                    version.append(dict_xml_render[item.filename])
-                    write_zip_file.writestr(item, str(version))
-                else:
-                    write_zip_file.writestr(item, read_zip_file.read(item.filename))
-    with open(temp_file.name, 'rb') as read_file:
-        return read_file.read()
+    :param members: Optional, content of other members to replace or to add.
+    :type members: Dict[str, bytes]
+
+    :returns: the document as a byte object.
+    """
+    buffer = io.BytesIO()
+    with RawZipFile(buffer, 'w') as write_zip_file:
+        archive.write(write_zip_file, rendered, members)
+    return buffer.getvalue()
 
 
 def clean_tags(content):
@@ -68,23 +107,71 @@ def clean_tags(content):
     )
 
 
-def get_content_url(url, type_request, data):
+def get_content_url(url, type_request, data, client=None):
+    """
+    Fetches a picture, returns the response or ``None`` if it is not accessible. Pictures fetched
+    by ``GET`` without data go through the asset cache, see ``template_engines.utils.assets``.
+
+    :param client: Optional, the HTTP client to use, a client with the default options otherwise.
+    :type client: template_engines.utils.http.HttpClient
+    """
+    if type_request.lower() not in HTTP_METHODS:
+        logger.error("Type of request specified not allowed")
+        return
+    client = client or get_default_client()
+    asset_cache = get_asset_cache()
+    if asset_cache is None or type_request.lower() != 'get' or data:
+        return request_content(url, type_request, data, client)
+    return asset_cache.get(url, lambda headers: request_content(url, type_request, data, client, headers))
+
+
+def request_content(url, type_request, data, client, headers=None):
+    """
+    Sends a request with ``client`` and reads its content, returns the response or ``None`` if it
+    failed. A ``304 Not Modified`` response is accepted for a conditional request.
+    """
     try:
-        response = getattr(requests, type_request.lower())(url, data=data)
+        response = client.request(type_request, url, data, headers)
     except requests.exceptions.ConnectionError:
         logger.error(f"Connection Error, check the url given ({url})")
         return
-    except AttributeError:
-        logger.error("Type of request specified not allowed")
+    except requests.exceptions.RequestException as e:
+        logger.error(f"The picture with url : {url} is not accessible ({e})")
         return
+    if response.status_code == 304 and headers:
+        response.close()
+        return response
     if response.status_code != 200:
+        response.close()
         logger.error(f"The picture with url : {url} is not accessible (Error: {response.status_code})")
         return
+    try:
+        client.read_content(response)
+    except ResponseTooLarge:
+        logger.error(f"The picture with url : {url} is larger than {client.max_size} bytes")
+        return
+    except requests.exceptions.RequestException as e:
+        logger.error(f"The picture with url : {url} is not accessible ({e})")
+        return
     return response
 
 
-def get_extension_picture(image):
-    bimage = io.BytesIO(image)
-    with Image.open(bimage) as img_reader:
-        extension = img_reader.format.lower()
-    return extension
+def get_extension_picture(image, digest=None):
+    return probe_image(image, digest).format
+
+
+def get_picture_name(picture, extension, digest=None):
+    """
+    Returns the name of a picture in a document. It is derived from the content of the picture, so
+    a picture used many times is embedded once.
+
+    :param picture: the picture's content.
+    :type picture: bytes
+
+    :param extension: the picture's extension.
+    :type extension: str
+
+    :param digest: Optional, the digest of the picture, see ``get_picture_digest``.
+    :type digest: str
+    """
+    return '{}.{}'.format(digest or get_picture_digest(picture), extension)
@@ -0,0 +1,198 @@
+import copy
+import io
+import re
+import struct
+from zipfile import ZipFile, sizeFileHeader
+
+# Local file header fields giving the lengths of the file name and of the extra field
+FILE_HEADER_NAMES_STRUCT = struct.Struct('<HH')
+FILE_HEADER_NAMES_OFFSET = 26
+# General purpose flag telling that CRC and sizes are written after the data
+DATA_DESCRIPTOR_FLAG = 0x08
+XML_DECLARATION_RE = re.compile(r'\s*<\?xml\s[^>]*\?>\s*')
+
+
+def get_raw_member_offset(fp, zinfo):
+    """
+    Returns the position in ``fp`` of the compressed data of a zip member.
+    """
+    fp.seek(zinfo.header_offset)
+    header = fp.read(sizeFileHeader)
+    name_length, extra_length = FILE_HEADER_NAMES_STRUCT.unpack_from(header, FILE_HEADER_NAMES_OFFSET)
+    return zinfo.header_offset + sizeFileHeader + name_length + extra_length
+
+
+def read_raw_member(zip_file, zinfo):
+    """
+    Returns the data of a zip member as stored in the archive, without decompressing it.
+
+    :param zip_file: a zip file opened for reading.
+    :type zip_file: zipfile.ZipFile
+
+    :param zinfo: the member to read.
+    :type zinfo: zipfile.ZipInfo
+    """
+    offset = get_raw_member_offset(zip_file.fp, zinfo)
+    zip_file.fp.seek(offset)
+    return zip_file.fp.read(zinfo.compress_size)
+
+
+def split_xml_declaration(content):
+    """
+    Returns the XML declaration of a document, with the blanks following it, and the rest of the
+    document.
+    """
+    match = XML_DECLARATION_RE.match(content)
+    if match is None:
+        return '', content
+    return match.group(0), content[match.end():]
+
+
+class RawZipFile(ZipFile):
+    """
+    Zip file which can also receive members already compressed, copied from another archive.
+    """
+
+    def write_raw(self, zinfo, raw_data):
+        """
+        Writes a member whose data is already compressed as described by ``zinfo``.
+
+        :param zinfo: the member description, as read from the original archive.
+        :type zinfo: zipfile.ZipInfo
+
+        :param raw_data: the compressed data.
+        :type raw_data: bytes
+        """
+        if self._writing:
+            raise ValueError("Can't write to ZIP archive while an open writing handle exists")
+        zinfo = copy.copy(zinfo)
+        # CRC and sizes are known, so they are written in the local header
+        zinfo.flag_bits &= ~DATA_DESCRIPTOR_FLAG
+        with self._lock:
+            if self._seekable:
+                self.fp.seek(self.start_dir)
+            zinfo.header_offset = self.fp.tell()
+            self._writecheck(zinfo)
+            self._didModify = True
+            self.fp.write(zinfo.FileHeader())
+            self.fp.write(raw_data)
+            self.filelist.append(zinfo)
+            self.NameToInfo[zinfo.filename] = zinfo
+            self.start_dir = self.fp.tell()
+
+    def copy_member(self, zip_file, zinfo):
+        """
+        Copies a member of another zip file opened for reading, without recompressing it.
+        """
+        self.write_raw(zinfo, read_raw_member(zip_file, zinfo))
+
+
+class StreamBuffer:
+    """
+    Write only file object keeping what is written until it is popped.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        """
+        Returns the data written since the last call.
+        """
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class TemplateArchive:
+    """
+    In memory skeleton of a zip template: the directory of the archive, the compressed content of
+    the members which are not rendered and the XML declaration of the rendered ones.
+    """
+
+    def __init__(self, template_buffer, rendered_files):
+        """
+        :param template_buffer: the zip template.
+        :type template_buffer: io.BytesIO
+
+        :param rendered_files: path of the members replaced by the rendered content.
+        :type rendered_files: List[str]
+        """
+        self.rendered_files = list(rendered_files)
+        self.data = template_buffer.getvalue()
+        self.offsets = {}
+        self.headers = {}
+        self._members = {}
+
+        with ZipFile(io.BytesIO(self.data), 'r') as zip_file:
+            self.infolist = zip_file.infolist()
+            for item in self.infolist:
+                if item.filename in self.rendered_files:
+                    self.headers[item.filename], _ = split_xml_declaration(zip_file.read(item.filename).decode())
+                else:
+                    self.offsets[item.filename] = get_raw_member_offset(zip_file.fp, item)
+
+    @property
+    def size(self):
+        """
+        Size in bytes of the content kept in memory.
+        """
+        return (len(self.data) + sum(len(header) for header in self.headers.values())
+                + sum(len(member) for member in self._members.values()))
+
+    def read(self, filename):
+        """
+        Returns the decompressed content of a member, kept for the next calls.
+        """
+        if filename not in self._members:
+            with ZipFile(io.BytesIO(self.data), 'r') as zip_file:
+                self._members[filename] = zip_file.read(filename)
+        return self._members[filename]
+
+    def get_raw_member(self, zinfo):
+        offset = self.offsets[zinfo.filename]
+        return memoryview(self.data)[offset:offset + zinfo.compress_size]
+
+    def write(self, write_zip_file, rendered, members=None):
+        """
+        Writes every member of the template in an open zip file, replacing the rendered ones. The
+        other members are copied without being recompressed.
+
+        :param write_zip_file: the zip file to fill.
+        :type write_zip_file: RawZipFile
+
+        :param rendered: the rendered content of each member listed in ``rendered_files``.
+        :type rendered: Dict[str, str]
+
+        :param members: Optional, content of members to replace, or to add after the members of
+                        the template.
+        :type members: Dict[str, bytes]
+        """
+        for _ in self.iter_write(write_zip_file, rendered, members):
+            pass
+
+    def iter_write(self, write_zip_file, rendered, members=None):
+        """
+        Same as ``write``, but yields the name of each member once it is written.
+        """
+        members = members or {}
+        for item in self.infolist:
+            if item.filename in self.rendered_files:
+                write_zip_file.writestr(copy.copy(item), self.headers[item.filename] + str(rendered[item.filename]))
+            elif item.filename in members:
+                write_zip_file.writestr(copy.copy(item), members[item.filename])
+            else:
+                write_zip_file.write_raw(item, self.get_raw_member(item))
+            yield item.filename
+
+        for filename, content in members.items():
+            if filename not in self.offsets and filename not in self.headers:
+                write_zip_file.writestr(filename, content)
+                yield filename
@@ -0,0 +1,215 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
+from email.utils import parsedate_to_datetime
+
+import requests
+from django.core.cache import caches
+
+from template_engines import settings as app_settings
+from template_engines.utils.cache import LRUCache
+
+CACHE_KEY_PREFIX = 'template_engines:asset:'
+
+
+def parse_cache_control(value):
+    """
+    Returns the directives of a ``Cache-Control`` header, lowercased, with their value if any.
+    """
+    directives = {}
+    for directive in (value or '').split(','):
+        name, _, argument = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip('"')
+    return directives
+
+
+def parse_http_date(value):
+    """
+    Returns the timestamp of an HTTP date, ``None`` if it is invalid.
+    """
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def get_freshness_lifetime(headers, default_timeout=0):
+    """
+    Returns how many seconds a response stays fresh according to its headers, or ``None`` if it
+    must not be stored.
+    """
+    cache_control = parse_cache_control(headers.get('cache-control'))
+    if 'no-store' in cache_control:
+        return None
+    if 'no-cache' in cache_control:
+        return 0
+    if 'max-age' in cache_control:
+        try:
+            lifetime = int(cache_control['max-age'])
+        except ValueError:
+            return 0
+    elif 'expires' in headers:
+        expires = parse_http_date(headers['expires'])
+        if expires is None:
+            return 0
+        date = parse_http_date(headers.get('date')) or time.time()
+        lifetime = expires - date
+    else:
+        lifetime = default_timeout
+    try:
+        lifetime -= int(headers.get('age', 0))
+    except ValueError:
+        pass
+    return max(lifetime, 0)
+
+
+class AssetCache:
+    """
+    Cache of the remote assets fetched by the renderings, shared by every rendering of the process
+    and, optionally, by every process through a Django cache.
+
+    Responses are stored according to their HTTP caching headers: they are reused while they are
+    fresh, then revalidated with their ``ETag`` or ``Last-Modified`` header. Concurrent requests
+    for the same URL are collapsed into a single fetch.
+    """
+
+    def __init__(self, max_size, cache_alias=None, default_timeout=0):
+        """
+        :param max_size: maximum size in bytes of the assets kept in memory.
+        :type max_size: int
+
+        :param cache_alias: Optional, name of a Django cache shared by every process.
+        :type cache_alias: str
+
+        :param default_timeout: seconds an asset stays fresh when its response gives no caching
+                                header.
+        :type default_timeout: int
+        """
+        self.local_cache = LRUCache(max_size)
+        self.cache_alias = cache_alias
+        self.default_timeout = default_timeout
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    @property
+    def shared_cache(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    def get_key(self, url):
+        return CACHE_KEY_PREFIX + hashlib.sha256(url.encode()).hexdigest()
+
+    def get_entry(self, key):
+        entry = self.local_cache.get(key)
+        if entry is None and self.shared_cache is not None:
+            entry = self.shared_cache.get(key)
+            if entry is not None:
+                self.local_cache.set(key, entry, len(entry['content']))
+        return entry
+
+    def set_entry(self, key, entry):
+        self.local_cache.set(key, entry, len(entry['content']))
+        if self.shared_cache is not None:
+            if entry['etag'] or entry['last_modified']:
+                # kept after expiration to be revalidated
+                self.shared_cache.set(key, entry)
+            else:
+                self.shared_cache.set(key, entry, max(int(entry['expires'] - time.time()), 1))
+
+    def clear(self):
+        """
+        Empties the in memory tier.
+        """
+        self.local_cache.clear()
+
+    def get(self, url, fetch):
+        """
+        Returns the response for ``url``, from the cache if it is still fresh.
+
+        :param fetch: function sending the request, called with the headers to add to it, and
+                      returning the response or ``None``.
+        :type fetch: Callable[[Dict[str, str]], requests.Response]
+        """
+        key = self.get_key(url)
+        entry = self.get_entry(key)
+        if entry is not None and entry['expires'] > time.time():
+            return self.make_response(url, entry)
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self._in_flight[key] = Future()
+        if not is_owner:
+            entry = future.result()
+            return self.make_response(url, entry) if entry is not None else None
+
+        try:
+            entry = self.fetch(key, entry, fetch)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(entry)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        return self.make_response(url, entry) if entry is not None else None
+
+    def fetch(self, key, entry, fetch):
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        response = fetch(headers)
+        if response is None:
+            return None
+
+        lifetime = get_freshness_lifetime(response.headers, self.default_timeout)
+        if response.status_code == 304 and entry is not None:
+            entry = dict(entry, expires=time.time() + (lifetime or 0))
+        else:
+            entry = {
+                'content': response.content,
+                'content_type': response.headers.get('content-type'),
+                'etag': response.headers.get('etag'),
+                'last_modified': response.headers.get('last-modified'),
+                'expires': time.time() + (lifetime or 0),
+            }
+        if lifetime is not None and (lifetime > 0 or entry['etag'] or entry['last_modified']):
+            self.set_entry(key, entry)
+        return entry
+
+    def make_response(self, url, entry):
+        response = requests.Response()
+        response.url = url
+        response.status_code = 200
+        if entry['content_type']:
+            response.headers['Content-Type'] = entry['content_type']
+        response._content = entry['content']
+        response._content_consumed = True
+        return response
+
+
+_asset_cache = None
+_asset_cache_lock = threading.Lock()
+
+
+def get_asset_cache():
+    """
+    Returns the asset cache of the process, ``None`` if it is disabled by the settings.
+    """
+    global _asset_cache
+    if not app_settings.TEMPLATE_ENGINES_ASSET_CACHE_MAX_SIZE and not app_settings.TEMPLATE_ENGINES_ASSET_CACHE:
+        return None
+    with _asset_cache_lock:
+        if _asset_cache is None:
+            _asset_cache = AssetCache(
+                app_settings.TEMPLATE_ENGINES_ASSET_CACHE_MAX_SIZE,
+                app_settings.TEMPLATE_ENGINES_ASSET_CACHE,
+                app_settings.TEMPLATE_ENGINES_ASSET_CACHE_DEFAULT_TIMEOUT,
+            )
+        return _asset_cache
@@ -0,0 +1,30 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from template_engines import settings as app_settings
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Returns the executor running the CPU bound work of asynchronous renderings, bounded by
+    ``TEMPLATE_ENGINES_ASYNC_MAX_WORKERS``.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app_settings.TEMPLATE_ENGINES_ASYNC_MAX_WORKERS,
+                                           thread_name_prefix='template_engines')
+        return _executor
+
+
+async def run_in_executor(func, *args):
+    """
+    Runs ``func`` in the rendering executor, without blocking the event loop.
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args))
@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread safe least recently used cache, bounded by the total size in bytes of its entries.
+    """
+
+    def __init__(self, max_size):
+        """
+        :param max_size: maximum total size, in bytes, of the stored entries.
+        :type max_size: int
+        """
+        self.max_size = max_size
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, size = self._entries[key]
+            except KeyError:
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, size):
+        """
+        Stores ``value`` and evicts the least recently used entries until the cache fits in
+        ``max_size``. A value bigger than ``max_size`` is not stored.
+        """
+        with self._lock:
+            self._pop(key)
+            if size > self.max_size:
+                return
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_size:
+                self._pop(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+
+class TTLCache:
+    """
+    Thread safe cache whose entries expire after ``timeout`` seconds, bounded by a number of
+    entries: the least recently used ones are evicted first.
+    """
+
+    def __init__(self, timeout, max_entries=None):
+        """
+        :param timeout: lifetime in seconds of an entry, nothing is stored if it is not positive.
+        :type timeout: float
+
+        :param max_entries: Optional, maximum number of stored entries, unbounded if ``None``.
+        :type max_entries: int
+        """
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, value = self._entries[key]
+            except KeyError:
+                return default
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.timeout <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
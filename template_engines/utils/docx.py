@@ -1,11 +1,15 @@
+import io
 import re
-from tempfile import NamedTemporaryFile
-from zipfile import ZipFile
 
+from template_engines.utils import write_archive
+from template_engines.utils.archive import TemplateArchive
 
-DOCX_RELATIONSHIP = (
+
+DOCX_RELATIONSHIP_TAG = (
     '<Relationship Id="{0}" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
-    + 'relationships/image" Target="media/{0}"/></Relationships>')
+    + 'relationships/image" Target="media/{0}"/>')
+DOCX_RELATIONSHIP = DOCX_RELATIONSHIP_TAG + '</Relationships>'
+DOCX_RELATIONSHIPS = 'word/_rels/document.xml.rels'
 
 
 DOCX_PARAGRAPH_RE = re.compile(
@@ -17,6 +21,42 @@ DOCX_CHANGES = {
 }
 
 
+def get_docx_image_members(relationships, images):
+    """
+    Returns the members to write in a docx document to embed images: the relationships of the
+    document and the images in the ``word/media`` folder.
+
+    :param relationships: the current content of ``word/_rels/document.xml.rels``.
+    :type relationships: bytes
+
+    :param images: dictionaries with at least two entries: the image's name and the image's content.
+    :type images: Iterable[dict]
+    """
+    members = {}
+    tags = []
+    for image in images:
+        tags.append(DOCX_RELATIONSHIP_TAG.format(image.get('name')))
+        members['word/media/{}'.format(image.get('name'))] = image.get('content')
+    members[DOCX_RELATIONSHIPS] = relationships.decode().replace(
+        '</Relationships>', ''.join(tags) + '</Relationships>')
+    return members
+
+
+def add_images_in_docx_template(bfile, images):
+    """
+    Makes images available for a docx document, rewriting it only once.
+
+    :param bfile: the docx document.
+    :type bfile: bytes
+
+    :param images: dictionaries with at least two entries: the image's name and the image's content.
+    :type images: Iterable[dict]
+    """
+    archive = TemplateArchive(io.BytesIO(bfile), [])
+    members = get_docx_image_members(archive.read(DOCX_RELATIONSHIPS), images)
+    return write_archive(archive, {}, members)
+
+
 def add_image_in_docx_template(bfile, image):
     """
     Makes an image available for a docx document.
@@ -27,36 +67,7 @@ def add_image_in_docx_template(bfile, image):
     :param image: a dictionary with at least two entries: the image's name and the image's content.
     :type image: dict
     """
-    temp_file = NamedTemporaryFile()
-    with open(temp_file.name, 'wb') as writer:
-        writer.write(bfile)
-
-    temp_doc = NamedTemporaryFile()
-    with ZipFile(temp_file.name, 'r') as read_zip_file:
-        info_list = read_zip_file.infolist()
-        with ZipFile(temp_doc.name, 'w') as write_zip_file:
-            # Add a relationship tag to word/_rels/document.xml.rels
-            for item in info_list:
-                if item.filename == 'word/_rels/document.xml.rels':
-                    doc_relationships = read_zip_file.read(item.filename).decode()
-                    doc_relationships = re.sub(
-                        '</Relationships>',
-                        DOCX_RELATIONSHIP.format(image.get('name')),
-                        doc_relationships)
-                    write_zip_file.writestr(item.filename, doc_relationships)
-                else:
-                    write_zip_file.writestr(item, read_zip_file.read(item.filename))
-
-            # Add the image in the word/media folder
-            temp_image = NamedTemporaryFile()
-            with open(temp_image.name, 'wb') as writer:
-                writer.write(image.get('content'))
-            write_zip_file.write(
-                temp_image.name,
-                arcname='word/media/{}'.format(image.get('name')))
-
-    with open(temp_doc.name, 'rb') as read_file:
-        return read_file.read()
+    return add_images_in_docx_template(bfile, [image])
 
 
 TO_CHANGE_RE = re.compile(r'\n|&lt;b&gt;|&lt;/b&gt;')
@@ -0,0 +1,178 @@
+import asyncio
+import functools
+import re
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from template_engines import settings as app_settings
+from template_engines.utils import get_content_url
+from template_engines.utils.http import get_default_client
+
+_local = threading.local()
+
+
+def get_current_fetcher():
+    """
+    Returns the ``ImageFetcher`` of the rendering in progress in this thread, if any.
+    """
+    return getattr(_local, 'fetcher', None)
+
+
+def get_current_client():
+    """
+    Returns the HTTP client of the rendering in progress in this thread, or a client with the
+    default options.
+    """
+    fetcher = get_current_fetcher()
+    if fetcher is not None and fetcher.client is not None:
+        return fetcher.client
+    return get_default_client()
+
+
+def get_current_image_options():
+    """
+    Returns the options of the pictures embedded by the rendering in progress in this thread, see
+    ``template_engines.utils.images.get_image_options``.
+    """
+    fetcher = get_current_fetcher()
+    if fetcher is not None and fetcher.image_options:
+        return fetcher.image_options
+    return {}
+
+
+def fetch_content_url(url, type_request, data):
+    """
+    Same as ``get_content_url``, but goes through the ``ImageFetcher`` of the rendering in
+    progress, if any, so a picture is fetched once by rendering.
+    """
+    fetcher = get_current_fetcher()
+    if fetcher is None:
+        return get_content_url(url, type_request, data)
+    return fetcher.get(url, type_request, data)
+
+
+class ImageFetcher:
+    """
+    Collects the remote pictures needed by a rendering and fetches them in parallel, with at most
+    ``max_workers`` simultaneous requests, sent by ``client`` or by a client with the default
+    options. ``image_options`` are the options of the embedded pictures.
+
+    Template tags rendered while the fetcher is active (inside a ``with`` block) can ``defer`` a
+    picture: they output a placeholder, replaced by ``resolve`` once every picture is fetched.
+    """
+
+    def __init__(self, max_workers=None, client=None, image_options=None):
+        self.max_workers = max_workers or app_settings.TEMPLATE_ENGINES_FETCH_MAX_WORKERS
+        self.client = client
+        self.image_options = image_options
+        self.responses = {}
+        self.used = set()
+        self.pending = {}
+        self.placeholders = []
+        self.placeholder_prefix = 'image-{}'.format(secrets.token_hex(8))
+        self.placeholder_re = re.compile(r'\[\[{}-(\d+)\]\]'.format(self.placeholder_prefix))
+
+    def __enter__(self):
+        self._previous = get_current_fetcher()
+        _local.fetcher = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _local.fetcher = self._previous
+
+    def get_key(self, url, type_request, data):
+        return url, type_request.lower(), repr(data)
+
+    def add(self, url, type_request="get", data=None):
+        """
+        Registers a picture to fetch, returns its key.
+        """
+        key = self.get_key(url, type_request, data)
+        self.used.add(key)
+        if key not in self.responses:
+            self.pending[key] = (url, type_request, data)
+        return key
+
+    def release(self):
+        """
+        Forgets the responses not used since the last call, so that a fetcher shared by many
+        renderings only keeps the pictures they have in common.
+        """
+        self.responses = {key: response for key, response in self.responses.items() if key in self.used}
+        self.used = set()
+
+    def fetch(self):
+        """
+        Fetches every registered picture not fetched yet.
+        """
+        pending, self.pending = self.pending, {}
+        if len(pending) <= 1 or self.max_workers <= 1:
+            responses = [get_content_url(*args, self.client) for args in pending.values()]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pending))) as executor:
+                responses = list(executor.map(lambda args: get_content_url(*args, self.client), pending.values()))
+        self.responses.update(zip(pending.keys(), responses))
+
+    async def afetch(self):
+        """
+        Same as ``fetch``, without blocking the event loop: the requests are sent from an executor
+        of at most ``max_workers`` threads, not from the default executor of the loop.
+        """
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        loop = asyncio.get_event_loop()
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(pending)))
+        try:
+            responses = await asyncio.gather(*(
+                loop.run_in_executor(executor, functools.partial(get_content_url, *args, self.client))
+                for args in pending.values()
+            ))
+        finally:
+            # the requests are done, or cancelled with the coroutine
+            executor.shutdown(wait=False)
+        self.responses.update(zip(pending.keys(), responses))
+
+    def run(self, func, *args):
+        """
+        Calls ``func`` with the fetcher active in the current thread.
+        """
+        with self:
+            return func(*args)
+
+    def get(self, url, type_request="get", data=None):
+        """
+        Returns the response for a picture, fetching it with the other pending ones if needed.
+        """
+        key = self.add(url, type_request, data)
+        if key not in self.responses:
+            self.fetch()
+        return self.responses[key]
+
+    def defer(self, url, type_request, data, callback):
+        """
+        Registers a picture and returns a placeholder, replaced in ``resolve`` by the result of
+        ``callback`` called with the response.
+        """
+        key = self.add(url, type_request, data)
+        self.placeholders.append((key, callback))
+        return '[[{}-{}]]'.format(self.placeholder_prefix, len(self.placeholders) - 1)
+
+    def resolve(self, rendered):
+        """
+        Fetches the pending pictures and replaces the placeholders given since the last call in
+        ``rendered``, a string or strings by name.
+        """
+        placeholders, self.placeholders = self.placeholders, []
+        if not placeholders:
+            return rendered
+        self.fetch()
+        results = [callback(self.responses[key]) for key, callback in placeholders]
+
+        def replace(content):
+            return self.placeholder_re.sub(lambda match: results[int(match.group(1))], content)
+
+        if isinstance(rendered, dict):
+            return {name: replace(content) for name, content in rendered.items()}
+        return replace(rendered)
@@ -0,0 +1,89 @@
+import threading
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HTTP_METHODS = ('get', 'post', 'put', 'patch', 'delete', 'head', 'options')
+
+
+class ResponseTooLarge(Exception):
+    pass
+
+
+class HttpClient:
+    """
+    Shared HTTP session used to fetch remote pictures, with a connection pool by host, timeouts,
+    a retry policy and a maximum response size.
+
+    It is configured by the ``http`` entry of the ``OPTIONS`` of an engine.
+    """
+
+    def __init__(self, connect_timeout=5, read_timeout=30, retries=2, backoff_factor=0.3,
+                 retry_statuses=(502, 503, 504), pool_connections=10, pool_maxsize=10,
+                 max_size=20 * 1024 * 1024):
+        """
+        :param connect_timeout: seconds to wait for the connection to a host.
+        :param read_timeout: seconds to wait between two bytes received from a host.
+        :param retries: number of retries on connection errors and on ``retry_statuses``.
+        :param backoff_factor: factor of the exponential delay between two retries.
+        :param retry_statuses: HTTP statuses which are retried.
+        :param pool_connections: number of hosts whose connections are kept.
+        :param pool_maxsize: number of connections kept by host.
+        :param max_size: maximum size of a response in bytes.
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_size = max_size
+        self.session = requests.Session()
+        # the session is shared by every rendering: the cookies of a host must not be sent back
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=retry_statuses),
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, type_request, url, data=None, headers=None):
+        """
+        Sends a request whose content is not read yet, see ``read_content``.
+        """
+        return self.session.request(type_request.upper(), url, data=data, headers=headers, timeout=self.timeout,
+                                    stream=True)
+
+    def read_content(self, response):
+        """
+        Reads the content of a response, raises ``ResponseTooLarge`` above ``max_size`` bytes.
+        """
+        content_length = response.headers.get('content-length')
+        if content_length and int(content_length) > self.max_size:
+            response.close()
+            raise ResponseTooLarge()
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(64 * 1024):
+            size += len(chunk)
+            if size > self.max_size:
+                response.close()
+                raise ResponseTooLarge()
+            chunks.append(chunk)
+        # make the content available as response.content
+        response._content = b''.join(chunks)
+        return response.content
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """
+    Returns the client used outside of an engine, with the default options.
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
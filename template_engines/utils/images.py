@@ -0,0 +1,184 @@
+import hashlib
+import io
+import logging
+import math
+import threading
+from collections import namedtuple
+
+from PIL import Image
+
+from template_engines import settings as app_settings
+from template_engines.utils.cache import LRUCache
+
+# formats which cannot keep an alpha channel
+OPAQUE_FORMATS = ('JPEG', 'BMP')
+# number of pictures whose metadata are kept
+IMAGE_INFO_CACHE_SIZE = 1024
+
+logger = logging.getLogger(__name__)
+
+ImageInfo = namedtuple('ImageInfo', ['format', 'width', 'height', 'mime_type'])
+ImageInfo.__doc__ = """
+Metadata of a picture: its format in lower case, like ``'png'``, its dimensions in pixels and its
+MIME type.
+"""
+
+_image_info_cache = LRUCache(IMAGE_INFO_CACHE_SIZE)
+
+
+def get_picture_digest(picture):
+    """
+    Returns the SHA-256 of a picture, as hexadecimal, which identifies its content in the caches
+    and in the documents.
+
+    :param picture: the picture's content.
+    :type picture: bytes
+    """
+    return hashlib.sha256(picture).hexdigest()
+
+
+def get_response_digest(response):
+    """
+    Returns the digest of the content of a fetched picture, computed once by response: a response
+    is shared by the tags and the renderings using the same picture.
+    """
+    digest = getattr(response, 'picture_digest', None)
+    if digest is None:
+        digest = response.picture_digest = get_picture_digest(response.content)
+    return digest
+
+
+def probe_image(picture, digest=None):
+    """
+    Returns the ``ImageInfo`` of a picture, read from its header only. The result is kept by
+    content, so a picture used by many tags or renderings is probed once.
+
+    :param picture: the picture's content.
+    :type picture: bytes
+
+    :param digest: Optional, the digest of the picture, see ``get_picture_digest``.
+    :type digest: str
+    """
+    key = digest or get_picture_digest(picture)
+    info = _image_info_cache.get(key)
+    if info is None:
+        # the pixels are not decoded until they are accessed
+        with Image.open(io.BytesIO(picture)) as image:
+            image_format = image.format.lower()
+            info = ImageInfo(image_format, image.width, image.height, f"image/{image_format}")
+        # entries are counted, not weighed
+        _image_info_cache.set(key, info, 1)
+    return info
+
+
+def get_image_options(dpi=None, quality=None, format=None):
+    """
+    Returns the options of the pictures embedded in the documents, given by the ``images`` entry of
+    the ``OPTIONS`` of an engine.
+
+    :param dpi: pixels by inch of the pictures at their displayed size, pictures are not resampled
+                if ``None``.
+    :type dpi: int
+
+    :param quality: quality of the re-encoded pictures, from 1 to 95 for JPEG.
+    :type quality: int
+
+    :param format: format of the re-encoded pictures, like ``'jpeg'`` or ``'png'``, the format of
+                   the picture is kept if ``None``.
+    :type format: str
+    """
+    return {'dpi': dpi, 'quality': quality, 'format': format}
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    """
+    Returns the cache of the optimized pictures of the process.
+    """
+    global _image_cache
+    with _image_cache_lock:
+        if _image_cache is None:
+            _image_cache = LRUCache(app_settings.TEMPLATE_ENGINES_IMAGE_CACHE_MAX_SIZE)
+        return _image_cache
+
+
+def optimize_image(picture, width, height, dpi=None, quality=None, format=None, digest=None):
+    """
+    Returns the picture resampled to ``dpi`` pixels by inch at its displayed size, and re-encoded
+    with ``quality`` or in ``format``. The result is cached by content and target size. The original
+    picture is returned when it cannot be decoded or re-encoded.
+
+    :param picture: the picture's content.
+    :type picture: bytes
+
+    :param width: displayed width in inches.
+    :type width: float
+
+    :param height: displayed height in inches.
+    :type height: float
+
+    :param digest: Optional, the digest of the picture, see ``get_picture_digest``.
+    :type digest: str
+    """
+    if not dpi and not quality and not format:
+        return picture
+    target_size = (max(math.ceil(width * dpi), 1), max(math.ceil(height * dpi), 1)) if dpi else None
+    key = (digest or get_picture_digest(picture), target_size, quality, format and format.upper())
+    cache = get_image_cache()
+    optimized = cache.get(key)
+    if optimized is None:
+        try:
+            optimized = encode_image(picture, target_size, quality, format)
+        except (OSError, ValueError, KeyError, Image.DecompressionBombError) as e:
+            # truncated picture, mode which cannot be saved in the format, unknown format...
+            logger.error(f"The picture cannot be optimized ({e!r}), it is embedded as is")
+            optimized = picture
+        cache.set(key, optimized, len(optimized))
+    return optimized
+
+
+def encode_image(picture, target_size=None, quality=None, format=None):
+    """
+    Shrinks the picture to fit in ``target_size`` pixels and re-encodes it. Returns the original
+    picture when it is already small enough and re-encoding does not make it lighter.
+    """
+    with Image.open(io.BytesIO(picture)) as image:
+        image_format = (format or image.format).upper()
+        if image_format == 'JPG':
+            image_format = 'JPEG'
+        if getattr(image, 'is_animated', False):
+            # only the first frame would be kept
+            return picture
+        resampled = target_size is not None and (image.width > target_size[0] or image.height > target_size[1])
+        if not resampled and not quality and image_format == image.format:
+            return picture
+
+        # the orientation of photos and their color profile are kept
+        exif, icc_profile, mode = image.info.get('exif'), image.info.get('icc_profile'), image.mode
+        if resampled:
+            # keeps the ratio, decodes JPEG pictures at a lower resolution when possible
+            image.thumbnail(target_size, Image.LANCZOS)
+        if image_format in OPAQUE_FORMATS and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+
+        save_options = {'optimize': True}
+        if quality:
+            save_options['quality'] = quality
+        if exif:
+            save_options['exif'] = exif
+        if icc_profile and image.mode == mode:
+            # a converted picture has no longer the colors described by the profile
+            save_options['icc_profile'] = icc_profile
+        buffer = io.BytesIO()
+        image.save(buffer, image_format, **save_options)
+
+    optimized = buffer.getvalue()
+    if not format and len(optimized) >= len(picture):
+        return picture
+    return optimized
@@ -1,13 +1,74 @@
-from bs4 import BeautifulSoup
+import io
 import os
-from tempfile import NamedTemporaryFile
-from zipfile import ZipFile
+
+from template_engines.utils import write_archive
+from template_engines.utils.archive import TemplateArchive
 
 ODT_IMAGE = (
     '<draw:frame draw:name="{0}" svg:width="{1}" svg:height="{2}" text:anchor-type="{3}" draw:z-index="37">'
     '<draw:image xlink:href="Pictures/{0}" xlink:type="simple" xlink:show="embed" xlink:actuate="onLoad" draw:mime-type="{4}" /></draw:frame>'
 )
 
+ODT_MANIFEST = 'META-INF/manifest.xml'
+ODT_MANIFEST_ENTRY = '<manifest:file-entry manifest:full-path="Pictures/{0}" manifest:media-type="image/{1}"/>'
+
+ODT_NAMESPACES = {
+    'office': 'urn:oasis:names:tc:opendocument:xmlns:office:1.0',
+    'style': 'urn:oasis:names:tc:opendocument:xmlns:style:1.0',
+    'text': 'urn:oasis:names:tc:opendocument:xmlns:text:1.0',
+    'draw': 'urn:oasis:names:tc:opendocument:xmlns:drawing:1.0',
+    'fo': 'urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0',
+    'svg': 'urn:oasis:names:tc:opendocument:xmlns:svg-compatible:1.0',
+    'table': 'urn:oasis:names:tc:opendocument:xmlns:table:1.0',
+    'xlink': 'http://www.w3.org/1999/xlink',
+}
+
+
+def odt_qname(name):
+    """
+    Returns the name of an odt element or attribute as used by lxml, from its prefixed name like
+    ``text:p``.
+    """
+    prefix, local_name = name.split(':')
+    return '{{{}}}{}'.format(ODT_NAMESPACES[prefix], local_name)
+
+
+def get_odt_image_members(manifest, images):
+    """
+    Returns the members to write in an odt document to embed images: the manifest listing them
+    and the images in the ``Pictures`` folder.
+
+    :param manifest: the current content of ``META-INF/manifest.xml``.
+    :type manifest: bytes
+
+    :param images: content of the images by name.
+    :type images: Dict[str, bytes]
+    """
+    members = {}
+    entries = []
+    for name, image in images.items():
+        _, ext = os.path.splitext(name)
+        entries.append(ODT_MANIFEST_ENTRY.format(name, ext))
+        members['Pictures/{}'.format(name)] = image
+    members[ODT_MANIFEST] = manifest.decode().replace(
+        '</manifest:manifest>', ''.join(entries) + '</manifest:manifest>')
+    return members
+
+
+def add_images_in_odt_template(bfile, images):
+    """
+    Makes images available for a odt document, rewriting it only once.
+
+    :param bfile: the odt document.
+    :type bfile: bytes
+
+    :param images: content of the images by name.
+    :type images: Dict[str, bytes]
+    """
+    archive = TemplateArchive(io.BytesIO(bfile), [])
+    members = get_odt_image_members(archive.read(ODT_MANIFEST), images)
+    return write_archive(archive, {}, members)
+
 
 def add_image_in_odt_template(bfile, image, name):
     """
@@ -16,42 +77,10 @@ def add_image_in_odt_template(bfile, image, name):
     :param bfile: the odt document.
     :type bfile: bytes
 
-    :param image: a dictionary with at least two entries: the image's name and the image's content.
-    :type image: dict
-    """
-    temp_file = NamedTemporaryFile()
-    with open(temp_file.name, 'wb') as writer:
-        writer.write(bfile)
-
-    temp_doc = NamedTemporaryFile()
-    with ZipFile(temp_file.name, 'r') as read_zip_file:
-        info_list = read_zip_file.infolist()
-        with ZipFile(temp_doc.name, 'w') as write_zip_file:
-            # Add a relationship tag to word/_rels/document.xml.rels
-            for item in info_list:
-                if item.filename == 'META-INF/manifest.xml':
-                    doc_relationships = read_zip_file.read(item.filename)
-                    soup = BeautifulSoup(doc_relationships, features='xml')
-                    manifest = soup.find('manifest:manifest')
-                    file_entry = soup.new_tag('manifest:file-entry')
-                    _, ext = os.path.splitext(name)
-                    attributes_file_entry = {
-                        'manifest:full-path': 'Pictures/{}'.format(name),
-                        'manifest:media-type': 'image/{}'.format(ext)
-                    }
-                    file_entry.attrs = attributes_file_entry
-                    manifest.append(file_entry)
-                    write_zip_file.writestr(item.filename, str(soup))
-                else:
-                    write_zip_file.writestr(item, read_zip_file.read(item.filename))
-
-            # Add the image in the word/media folder
-            temp_image = NamedTemporaryFile()
-
-            with open(temp_image.name, 'wb') as writer:
-                writer.write(image)
-            write_zip_file.write(
-                temp_image.name,
-                arcname='Pictures/{}'.format(name))
-    with open(temp_doc.name, 'rb') as read_file:
-        return read_file.read()
+    :param image: the image's content.
+    :type image: bytes
+
+    :param name: the image's name.
+    :type name: str
+    """
+    return add_images_in_odt_template(bfile, {name: image})